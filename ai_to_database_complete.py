@@ -8,10 +8,14 @@ Works without historical data using intelligent estimates
 import sqlite3
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
 import joblib
 import os
-import math
+
+try:  # numba اختياري — يسرّع الحسابات العددية عند توفره
+    from numba import njit as _njit
+except ImportError:
+    _njit = None
+
 
 # ============================================================================
 # STEP 1: ضع مسار نماذجك هنا
@@ -23,6 +27,95 @@ DATABASE_PATH = 'smart_house.db'
 
 # ============================================================================
 
+# استهلاك أساسي لكل ساعة (LUT بدل سلسلة if/elif)
+# 0-5 night, 6-8 morning peak, 9-11 late morning, 12-13 lunch,
+# 14-17 afternoon, 18-21 evening peak, 22-23 late night
+_CONSUMPTION_BASE = np.array(
+    [150, 150, 150, 150, 150, 150,
+     400, 400, 400,
+     300, 300, 300,
+     350, 350,
+     280, 280, 280, 280,
+     450, 450, 450, 450,
+     200, 200], dtype=np.float32)
+
+# جداول الـ sin/cos الدورية — تُحسب مرة واحدة عند الاستيراد
+# (النطاقات صغيرة: 24 ساعة، 12 شهر، 7 أيام، 366 يوم سنة)
+_HOUR_SIN = np.sin(2 * np.pi * np.arange(24) / 24).astype(np.float32)
+_HOUR_COS = np.cos(2 * np.pi * np.arange(24) / 24).astype(np.float32)
+_MONTH_SIN = np.sin(2 * np.pi * np.arange(13) / 12).astype(np.float32)
+_MONTH_COS = np.cos(2 * np.pi * np.arange(13) / 12).astype(np.float32)
+_DOW_SIN = np.sin(2 * np.pi * np.arange(7) / 7).astype(np.float32)
+_DOW_COS = np.cos(2 * np.pi * np.arange(7) / 7).astype(np.float32)
+_DOY_SIN = np.sin(2 * np.pi * np.arange(367) / 365).astype(np.float32)
+_DOY_COS = np.cos(2 * np.pi * np.arange(367) / 365).astype(np.float32)
+
+
+def _sun_geometry_batch(hour, day_of_year):
+    """حساب ارتفاع الشمس واتجاهها وAir Mass لدفعة كاملة"""
+    day_mask = (hour >= 6) & (hour <= 18)
+
+    elevation = 60 * np.sin((hour - 6) * np.pi / 12)
+    elevation += np.sin(2 * np.pi * (day_of_year - 80) / 365) * 20
+    elevation = np.where(day_mask, np.maximum(elevation, 0), 0.0)
+
+    azimuth = np.where(day_mask, 90 + 180 * (hour - 6) / 12, 0.0)
+
+    elevation_rad = np.deg2rad(elevation)
+    inv_pow = 1.0 / ((6.07995 + elevation) ** 1.6364)
+    am = 1 / (np.sin(elevation_rad) + 0.50572 * inv_pow)
+    air_mass = np.where(elevation > 0, np.minimum(am, 10), 10.0)
+
+    return elevation, azimuth, air_mass
+
+
+if _njit is not None:
+    # نسخة مُترجمة: حلقة واحدة مدموجة بدل عدة تمريرات numpy
+    @_njit(cache=True, fastmath=True)
+    def _sun_geometry_batch(hour, day_of_year):  # noqa: F811
+        n = hour.shape[0]
+        elevation = np.zeros(n)
+        azimuth = np.zeros(n)
+        air_mass = np.full(n, 10.0)
+        for i in range(n):
+            h = hour[i]
+            if 6 <= h <= 18:
+                e = 60.0 * np.sin((h - 6) * np.pi / 12)
+                e += np.sin(2 * np.pi * (day_of_year[i] - 80) / 365) * 20.0
+                e = max(0.0, e)
+                elevation[i] = e
+                azimuth[i] = 90.0 + 180.0 * (h - 6) / 12.0
+                if e > 0:
+                    inv_pow = 1.0 / ((6.07995 + e) ** 1.6364)
+                    am = 1.0 / (np.sin(e * (np.pi / 180.0)) + 0.50572 * inv_pow)
+                    air_mass[i] = min(am, 10.0)
+        return elevation, azimuth, air_mass
+
+
+def _weather_trig_batch(hour, day_of_year):
+    """الجزء الحتمي (trig + geometry) من محاكاة الطقس لدفعة كاملة"""
+    day_phase = np.sin((hour - 6) * np.pi / 12)
+    seasonal = _DOY_SIN[day_of_year]
+    radiation_base = np.where((hour >= 6) & (hour <= 18), 800 * day_phase, 0.0)
+    temp_base = 20 + 10 * seasonal + 5 * day_phase
+    humidity_base = 50 + 20 * seasonal
+    return radiation_base, temp_base, humidity_base
+
+
+if _njit is not None:
+    from numba import guvectorize as _guvectorize
+
+    # gufunc متوازية: SIMD + خيوط متعددة للدفعات الكبيرة
+    @_guvectorize(['(int64[:], int64[:], float64[:], float64[:], float64[:])'],
+                  '(n),(n)->(n),(n),(n)', target='parallel', fastmath=True, cache=True)
+    def _weather_trig_batch(hour, day_of_year, radiation_base, temp_base, humidity_base):  # noqa: F811
+        for i in range(hour.shape[0]):
+            day_phase = np.sin((hour[i] - 6) * np.pi / 12)
+            seasonal = np.sin(2 * np.pi * day_of_year[i] / 365)
+            radiation_base[i] = 800.0 * day_phase if 6 <= hour[i] <= 18 else 0.0
+            temp_base[i] = 20.0 + 10.0 * seasonal + 5.0 * day_phase
+            humidity_base[i] = 50.0 + 20.0 * seasonal
+
 
 class FeatureEngineer:
     """هندسة الميزات الكاملة"""
@@ -30,334 +123,338 @@ class FeatureEngineer:
     def __init__(self):
         self.historical_pv = []
         self.historical_consumption = []
+        # مولّد أرقام عشوائية واحد (PCG64 أسرع من الـ global RandomState)
+        self._rng = np.random.default_rng()
     
-    def create_pv_features(self, timestamp, base_weather=None):
-        """إنشاء جميع الـ 84 feature للـ PV Model"""
-        
-        # Parse timestamp
-        dt = pd.Timestamp(timestamp)
-        hour = dt.hour
-        month = dt.month
-        day_of_year = dt.dayofyear
-        day_of_week = dt.dayofweek
-        
+    def create_pv_features(self, timestamp, col_map, base_weather=None):
+        """إنشاء جميع الـ 84 feature للـ PV Model لوقت واحد
+
+        يمر عبر المسار الدفعي نفسه، فلا يُبنى أي dict وسيط —
+        النتيجة صف واحد من مصفوفة الميزات.
+        """
+        return self.create_pv_features_batch(
+            pd.DatetimeIndex([pd.Timestamp(timestamp)]), col_map, base_weather
+        )[0]
+
+    def create_consumption_features(self, timestamp, col_map, base_consumption=None):
+        """إنشاء جميع الـ 83 feature للـ Consumption Model لوقت واحد"""
+        return self.create_consumption_features_batch(
+            pd.DatetimeIndex([pd.Timestamp(timestamp)]), col_map, base_consumption
+        )[0]
+
+    def create_pv_features_batch(self, timestamps, col_map, base_weather=None):
+        """إنشاء جميع الـ 84 feature للـ PV Model لدفعة كاملة من الأوقات
+
+        Writes every feature straight into a preallocated (N, n_features)
+        ndarray at the column positions given by `col_map` — no per-hour
+        dicts and no pandas DataFrame construction on the hot path.
+        """
+        idx = pd.DatetimeIndex(timestamps)
+        hour = idx.hour.values
+        month = idx.month.values
+        day_of_year = idx.dayofyear.values
+        day_of_week = idx.dayofweek.values
+        week_of_year = idx.isocalendar().week.values.astype(np.int64)
+
         # Base weather (محاكاة)
         if base_weather is None:
-            base_weather = self._generate_weather(hour, day_of_year)
-        
+            base_weather = self._generate_weather_batch(hour, day_of_year)
+
         radiation = base_weather['radiation']
         temperature = base_weather['temperature']
         humidity = base_weather['humidity']
         wind_speed = base_weather['wind_speed']
         pressure = base_weather['pressure']
         sunshine = base_weather['sunshine']
-        
+
         # Sun position (محاكاة)
-        sun_elevation = self._calculate_sun_elevation(hour, day_of_year)
-        sun_azimuth = self._calculate_sun_azimuth(hour, day_of_year)
-        air_mass = self._calculate_air_mass(sun_elevation)
-        
-        # Time features
-        features = {
-            # 1-6: Base weather
-            'WindSpeed': wind_speed,
-            'Sunshine': sunshine,
-            'AirPressure': pressure,
-            'Radiation': radiation,
-            'AirTemperature': temperature,
-            'RelativeAirHumidity': humidity,
-            
-            # 7-12: Time components
-            'Hour': hour,
-            'Month': month,
-            'DayOfYear': day_of_year,
-            'DayOfWeek': day_of_week,
-            'Quarter': (month - 1) // 3 + 1,
-            'WeekOfYear': dt.isocalendar()[1],
-            
-            # 13-20: Cyclical time
-            'Hour_sin': np.sin(2 * np.pi * hour / 24),
-            'Hour_cos': np.cos(2 * np.pi * hour / 24),
-            'Month_sin': np.sin(2 * np.pi * month / 12),
-            'Month_cos': np.cos(2 * np.pi * month / 12),
-            'DayOfYear_sin': np.sin(2 * np.pi * day_of_year / 365),
-            'DayOfYear_cos': np.cos(2 * np.pi * day_of_year / 365),
-            'DayOfWeek_sin': np.sin(2 * np.pi * day_of_week / 7),
-            'DayOfWeek_cos': np.cos(2 * np.pi * day_of_week / 7),
-            
-            # 21-28: Solar and time flags
-            'SunElevation': sun_elevation,
-            'SunAzimuth': sun_azimuth,
-            'AirMass': air_mass,
-            'IsDay': 1 if 6 <= hour <= 18 else 0,
-            'IsPeakSun': 1 if 10 <= hour <= 14 else 0,
-            'IsMorning': 1 if 6 <= hour < 12 else 0,
-            'IsAfternoon': 1 if 12 <= hour < 18 else 0,
-            'IsWeekend': 1 if day_of_week >= 5 else 0,
-            
-            # 29: Season
-            'Season': (month % 12 + 3) // 3,
-            
-            # 30-39: Interaction features
-            'Radiation_Temp': radiation * temperature,
-            'Radiation_SunElev': radiation * sun_elevation,
-            'Radiation_Sunshine': radiation * sunshine,
-            'Radiation_Sunshine_Ratio': radiation / (sunshine + 0.01),
-            'Radiation_AirMass': radiation / (air_mass + 0.01),
-            'Wind_Temp': wind_speed * temperature,
-            'Temp_Humidity': temperature * humidity,
-            'Pressure_Temp': pressure * temperature,
-            'Radiation_Temp_SunElev': radiation * temperature * sun_elevation,
-            'Radiation_Sunshine_Humidity': radiation * sunshine * humidity,
-        }
-        
-        # 40-56: Moving averages (محاكاة من البيانات التاريخية)
+        sun_elevation, sun_azimuth, air_mass = _sun_geometry_batch(hour, day_of_year)
+
         production_estimate = radiation * 0.15  # تقدير بسيط
-        
-        features.update({
-            'Radiation_MA2': radiation * 0.98,
-            'Radiation_MA3': radiation * 0.97,
-            'Radiation_MA6': radiation * 0.95,
-            'Radiation_MA12': radiation * 0.93,
-            'Radiation_Std3': radiation * 0.1,
-            'Radiation_Std6': radiation * 0.12,
-            'Radiation_Max3': radiation * 1.15,
-            'Radiation_Min3': radiation * 0.85,
-            'Temp_MA2': temperature * 0.99,
-            'Temp_MA3': temperature * 0.98,
-            'Temp_MA6': temperature * 0.97,
-            'Temp_Std3': temperature * 0.05,
-            'Wind_MA2': wind_speed * 0.99,
-            'Wind_MA3': wind_speed * 0.98,
-            'Wind_Std3': wind_speed * 0.15,
-            'Sunshine_MA3': sunshine * 0.98,
-            'Sunshine_MA6': sunshine * 0.96,
-        })
-        
+        max_daily_radiation = 1000  # تقدير
+
+        # zeros وليس empty: أي feature في col_map لا يكتبه هذا الباني
+        # يبقى صفراً معروفاً بدل ذاكرة غير مهيأة تصل للنموذج بصمت
+        out = np.zeros((len(idx), len(col_map)), dtype=np.float32)
+
+        # 1-6: Base weather
+        out[:, col_map['WindSpeed']] = wind_speed
+        out[:, col_map['Sunshine']] = sunshine
+        out[:, col_map['AirPressure']] = pressure
+        out[:, col_map['Radiation']] = radiation
+        out[:, col_map['AirTemperature']] = temperature
+        out[:, col_map['RelativeAirHumidity']] = humidity
+
+        # 7-12: Time components
+        out[:, col_map['Hour']] = hour
+        out[:, col_map['Month']] = month
+        out[:, col_map['DayOfYear']] = day_of_year
+        out[:, col_map['DayOfWeek']] = day_of_week
+        out[:, col_map['Quarter']] = (month - 1) // 3 + 1
+        out[:, col_map['WeekOfYear']] = week_of_year
+
+        # 13-20: Cyclical time
+        out[:, col_map['Hour_sin']] = _HOUR_SIN[hour]
+        out[:, col_map['Hour_cos']] = _HOUR_COS[hour]
+        out[:, col_map['Month_sin']] = _MONTH_SIN[month]
+        out[:, col_map['Month_cos']] = _MONTH_COS[month]
+        out[:, col_map['DayOfYear_sin']] = _DOY_SIN[day_of_year]
+        out[:, col_map['DayOfYear_cos']] = _DOY_COS[day_of_year]
+        out[:, col_map['DayOfWeek_sin']] = _DOW_SIN[day_of_week]
+        out[:, col_map['DayOfWeek_cos']] = _DOW_COS[day_of_week]
+
+        # 21-28: Solar and time flags
+        out[:, col_map['SunElevation']] = sun_elevation
+        out[:, col_map['SunAzimuth']] = sun_azimuth
+        out[:, col_map['AirMass']] = air_mass
+        out[:, col_map['IsDay']] = ((hour >= 6) & (hour <= 18)).astype(np.float32)
+        out[:, col_map['IsPeakSun']] = ((hour >= 10) & (hour <= 14)).astype(np.float32)
+        out[:, col_map['IsMorning']] = ((hour >= 6) & (hour < 12)).astype(np.float32)
+        out[:, col_map['IsAfternoon']] = ((hour >= 12) & (hour < 18)).astype(np.float32)
+        out[:, col_map['IsWeekend']] = (day_of_week >= 5).astype(np.float32)
+
+        # 29: Season
+        out[:, col_map['Season']] = (month % 12 + 3) // 3
+
+        # 30-39: Interaction features
+        out[:, col_map['Radiation_Temp']] = radiation * temperature
+        out[:, col_map['Radiation_SunElev']] = radiation * sun_elevation
+        out[:, col_map['Radiation_Sunshine']] = radiation * sunshine
+        out[:, col_map['Radiation_Sunshine_Ratio']] = radiation / (sunshine + 0.01)
+        out[:, col_map['Radiation_AirMass']] = radiation / (air_mass + 0.01)
+        out[:, col_map['Wind_Temp']] = wind_speed * temperature
+        out[:, col_map['Temp_Humidity']] = temperature * humidity
+        out[:, col_map['Pressure_Temp']] = pressure * temperature
+        out[:, col_map['Radiation_Temp_SunElev']] = radiation * temperature * sun_elevation
+        out[:, col_map['Radiation_Sunshine_Humidity']] = radiation * sunshine * humidity
+
+        # 40-56: Moving averages (محاكاة من البيانات التاريخية)
+        out[:, col_map['Radiation_MA2']] = radiation * 0.98
+        out[:, col_map['Radiation_MA3']] = radiation * 0.97
+        out[:, col_map['Radiation_MA6']] = radiation * 0.95
+        out[:, col_map['Radiation_MA12']] = radiation * 0.93
+        out[:, col_map['Radiation_Std3']] = radiation * 0.1
+        out[:, col_map['Radiation_Std6']] = radiation * 0.12
+        out[:, col_map['Radiation_Max3']] = radiation * 1.15
+        out[:, col_map['Radiation_Min3']] = radiation * 0.85
+        out[:, col_map['Temp_MA2']] = temperature * 0.99
+        out[:, col_map['Temp_MA3']] = temperature * 0.98
+        out[:, col_map['Temp_MA6']] = temperature * 0.97
+        out[:, col_map['Temp_Std3']] = temperature * 0.05
+        out[:, col_map['Wind_MA2']] = wind_speed * 0.99
+        out[:, col_map['Wind_MA3']] = wind_speed * 0.98
+        out[:, col_map['Wind_Std3']] = wind_speed * 0.15
+        out[:, col_map['Sunshine_MA3']] = sunshine * 0.98
+        out[:, col_map['Sunshine_MA6']] = sunshine * 0.96
+
         # 57-59: Production MA
-        features.update({
-            'Production_MA2': production_estimate * 0.98,
-            'Production_MA3': production_estimate * 0.97,
-            'Production_Std3': production_estimate * 0.1,
-        })
-        
+        out[:, col_map['Production_MA2']] = production_estimate * 0.98
+        out[:, col_map['Production_MA3']] = production_estimate * 0.97
+        out[:, col_map['Production_Std3']] = production_estimate * 0.1
+
         # 60-73: Lag features (محاكاة)
-        features.update({
-            'Radiation_Lag1': radiation * 0.95,
-            'Production_Lag1': production_estimate * 0.95,
-            'Radiation_Lag2': radiation * 0.90,
-            'Production_Lag2': production_estimate * 0.90,
-            'Radiation_Lag3': radiation * 0.85,
-            'Production_Lag3': production_estimate * 0.85,
-            'Radiation_Lag6': radiation * 0.75,
-            'Production_Lag6': production_estimate * 0.75,
-            'Temp_Lag1': temperature * 0.98,
-            'Sunshine_Lag1': sunshine * 0.95,
-            'Temp_Lag2': temperature * 0.96,
-            'Sunshine_Lag2': sunshine * 0.90,
-            'Temp_Lag3': temperature * 0.94,
-            'Sunshine_Lag3': sunshine * 0.85,
-        })
-        
+        out[:, col_map['Radiation_Lag1']] = radiation * 0.95
+        out[:, col_map['Production_Lag1']] = production_estimate * 0.95
+        out[:, col_map['Radiation_Lag2']] = radiation * 0.90
+        out[:, col_map['Production_Lag2']] = production_estimate * 0.90
+        out[:, col_map['Radiation_Lag3']] = radiation * 0.85
+        out[:, col_map['Production_Lag3']] = production_estimate * 0.85
+        out[:, col_map['Radiation_Lag6']] = radiation * 0.75
+        out[:, col_map['Production_Lag6']] = production_estimate * 0.75
+        out[:, col_map['Temp_Lag1']] = temperature * 0.98
+        out[:, col_map['Sunshine_Lag1']] = sunshine * 0.95
+        out[:, col_map['Temp_Lag2']] = temperature * 0.96
+        out[:, col_map['Sunshine_Lag2']] = sunshine * 0.90
+        out[:, col_map['Temp_Lag3']] = temperature * 0.94
+        out[:, col_map['Sunshine_Lag3']] = sunshine * 0.85
+
         # 74-77: Delta features
-        features.update({
-            'Radiation_Delta1': radiation * 0.05,
-            'Radiation_Delta2': radiation * 0.08,
-            'Temp_Delta1': temperature * 0.02,
-            'Production_Delta1': production_estimate * 0.05,
-        })
-        
+        out[:, col_map['Radiation_Delta1']] = radiation * 0.05
+        out[:, col_map['Radiation_Delta2']] = radiation * 0.08
+        out[:, col_map['Temp_Delta1']] = temperature * 0.02
+        out[:, col_map['Production_Delta1']] = production_estimate * 0.05
+
         # 78-79: Trend features
-        features.update({
-            'Radiation_Trend3': 0.02 if hour < 12 else -0.02,
-            'Temp_Trend3': 0.01 if hour < 14 else -0.01,
-        })
-        
+        out[:, col_map['Radiation_Trend3']] = np.where(hour < 12, 0.02, -0.02)
+        out[:, col_map['Temp_Trend3']] = np.where(hour < 14, 0.01, -0.01)
+
         # 80-84: Ratio and squared features
-        max_daily_radiation = 1000  # تقدير
-        features.update({
-            'Radiation_to_MaxDaily': radiation / max_daily_radiation,
-            'Production_to_Radiation': production_estimate / (radiation + 0.01),
-            'Radiation_Squared': radiation ** 2,
-            'SunElevation_Squared': sun_elevation ** 2,
-            'Sunshine_Squared': sunshine ** 2,
-        })
-        
-        return features
-    
-    def create_consumption_features(self, timestamp, base_consumption=None):
-        """إنشاء جميع الـ 83 feature للـ Consumption Model"""
-        
-        dt = pd.Timestamp(timestamp)
-        hour = dt.hour
-        month = dt.month
-        day = dt.day
-        day_of_year = dt.dayofyear
-        day_of_week = dt.dayofweek
-        year = dt.year
-        
+        out[:, col_map['Radiation_to_MaxDaily']] = radiation / max_daily_radiation
+        out[:, col_map['Production_to_Radiation']] = production_estimate / (radiation + 0.01)
+        out[:, col_map['Radiation_Squared']] = radiation ** 2
+        out[:, col_map['SunElevation_Squared']] = sun_elevation ** 2
+        out[:, col_map['Sunshine_Squared']] = sunshine ** 2
+
+        return out
+
+    def create_consumption_features_batch(self, timestamps, col_map, base_consumption=None):
+        """إنشاء جميع الـ 83 feature للـ Consumption Model لدفعة كاملة"""
+        idx = pd.DatetimeIndex(timestamps)
+        hour = idx.hour.values
+        month = idx.month.values
+        day = idx.day.values
+        day_of_year = idx.dayofyear.values
+        day_of_week = idx.dayofweek.values
+        year = idx.year.values
+        minute = idx.minute.values
+        week_of_year = idx.isocalendar().week.values.astype(np.int64)
+
         # Base consumption estimate
         if base_consumption is None:
-            base_consumption = self._estimate_consumption(hour, day_of_week)
-        
-        features = {
-            # 1: Std (محاكاة)
-            'Consumption_Std': base_consumption * 0.15,
-            
-            # 2-9: Time components
-            'Year': year,
-            'Month': month,
-            'Day': day,
-            'Hour': hour,
-            'DayOfWeek': day_of_week,
-            'DayOfYear': day_of_year,
-            'WeekOfYear': dt.isocalendar()[1],
-            'Quarter': (month - 1) // 3 + 1,
-            
-            # 10-17: Cyclical time
-            'Hour_sin': np.sin(2 * np.pi * hour / 24),
-            'Hour_cos': np.cos(2 * np.pi * hour / 24),
-            'Month_sin': np.sin(2 * np.pi * month / 12),
-            'Month_cos': np.cos(2 * np.pi * month / 12),
-            'DayOfYear_sin': np.sin(2 * np.pi * day_of_year / 365),
-            'DayOfYear_cos': np.cos(2 * np.pi * day_of_year / 365),
-            'DayOfWeek_sin': np.sin(2 * np.pi * day_of_week / 7),
-            'DayOfWeek_cos': np.cos(2 * np.pi * day_of_week / 7),
-            
-            # 18: Time of day
-            'TimeOfDay': hour + dt.minute / 60,
-            
-            # 19-26: Time flags
-            'IsWeekend': 1 if day_of_week >= 5 else 0,
-            'IsPeakMorning': 1 if 7 <= hour <= 9 else 0,
-            'IsPeakEvening': 1 if 18 <= hour <= 21 else 0,
-            'IsPeakHour': 1 if (7 <= hour <= 9) or (18 <= hour <= 21) else 0,
-            'IsWorkingHour': 1 if 8 <= hour <= 17 else 0,
-            'IsNight': 1 if hour < 6 or hour >= 22 else 0,
-            'IsSleepTime': 1 if 23 <= hour or hour < 6 else 0,
-            'Season': (month % 12 + 3) // 3,
-            
-            # 27-28: Within hour stats
-            'Within_Hour_Std': base_consumption * 0.05,
-            'Within_Hour_Range': base_consumption * 0.1,
-        }
-        
-        # 29-37: Lag features (محاكاة من أنماط متوقعة)
-        features.update({
-            'Consumption_Lag1h': base_consumption * 0.98,
-            'Consumption_Lag2h': base_consumption * 0.96,
-            'Consumption_Lag3h': base_consumption * 0.94,
-            'Consumption_Lag6h': base_consumption * 0.90,
-            'Consumption_Lag12h': base_consumption * 0.85,
-            'Consumption_Lag24h': base_consumption * 0.95,  # نفس الساعة أمس
-            'Consumption_Lag48h': base_consumption * 0.93,
-            'Consumption_Lag72h': base_consumption * 0.91,
-            'Consumption_Lag168h': base_consumption * 0.94,  # نفس اليوم الأسبوع الماضي
-        })
-        
-        # 38-58: Moving averages and statistics
-        features.update({
-            'Consumption_MA3h': base_consumption * 0.99,
-            'Consumption_MA6h': base_consumption * 0.98,
-            'Consumption_Std6h': base_consumption * 0.08,
-            'Consumption_MA12h': base_consumption * 0.97,
-            'Consumption_Std12h': base_consumption * 0.10,
-            'Consumption_MA24h': base_consumption * 0.96,
-            'Consumption_Std24h': base_consumption * 0.12,
-            'Consumption_Max24h': base_consumption * 1.25,
-            'Consumption_Min24h': base_consumption * 0.75,
-            'Consumption_MA48h': base_consumption * 0.95,
-            'Consumption_Std48h': base_consumption * 0.13,
-            'Consumption_Max48h': base_consumption * 1.30,
-            'Consumption_Min48h': base_consumption * 0.70,
-            'Consumption_MA72h': base_consumption * 0.94,
-            'Consumption_Std72h': base_consumption * 0.14,
-            'Consumption_Max72h': base_consumption * 1.35,
-            'Consumption_Min72h': base_consumption * 0.68,
-            'Consumption_MA168h': base_consumption * 0.93,
-            'Consumption_Std168h': base_consumption * 0.15,
-            'Consumption_Max168h': base_consumption * 1.40,
-            'Consumption_Min168h': base_consumption * 0.65,
-        })
-        
-        # 59-64: Delta and trend features
-        features.update({
-            'Consumption_Delta1h': base_consumption * 0.02,
-            'Consumption_Delta3h': base_consumption * 0.04,
-            'Consumption_Delta6h': base_consumption * 0.06,
-            'Consumption_Delta24h': base_consumption * 0.03,
-            'Consumption_Trend6h': 0.01 if 6 <= hour <= 12 else -0.01,
-            'Consumption_Trend24h': 0.005,
-        })
-        
-        # 65-74: Aggregated statistics
+            base_consumption = self._estimate_consumption_batch(hour, day_of_week)
+
         daily_mean = base_consumption * 0.95
         weekly_mean = base_consumption * 0.96
         hourly_mean = base_consumption
         monthly_mean = base_consumption * 0.97
-        dayofweek_mean = base_consumption * (1.05 if day_of_week < 5 else 0.95)
-        
-        features.update({
-            'DailyMean': daily_mean,
-            'DailyStd': daily_mean * 0.15,
-            'DailyMax': daily_mean * 1.30,
-            'DailyMin': daily_mean * 0.70,
-            'WeeklyMean': weekly_mean,
-            'WeeklyStd': weekly_mean * 0.18,
-            'HourlyMean': hourly_mean,
-            'HourlyStd': hourly_mean * 0.12,
-            'MonthlyMean': monthly_mean,
-            'DayOfWeekMean': dayofweek_mean,
-        })
-        
+        dayofweek_mean = base_consumption * np.where(day_of_week < 5, 1.05, 0.95)
+
+        # zeros وليس empty — نفس ضمانة باني الـ PV أعلاه
+        out = np.zeros((len(idx), len(col_map)), dtype=np.float32)
+
+        # 1: Std (محاكاة)
+        out[:, col_map['Consumption_Std']] = base_consumption * 0.15
+
+        # 2-9: Time components
+        out[:, col_map['Year']] = year
+        out[:, col_map['Month']] = month
+        out[:, col_map['Day']] = day
+        out[:, col_map['Hour']] = hour
+        out[:, col_map['DayOfWeek']] = day_of_week
+        out[:, col_map['DayOfYear']] = day_of_year
+        out[:, col_map['WeekOfYear']] = week_of_year
+        out[:, col_map['Quarter']] = (month - 1) // 3 + 1
+
+        # 10-17: Cyclical time
+        out[:, col_map['Hour_sin']] = _HOUR_SIN[hour]
+        out[:, col_map['Hour_cos']] = _HOUR_COS[hour]
+        out[:, col_map['Month_sin']] = _MONTH_SIN[month]
+        out[:, col_map['Month_cos']] = _MONTH_COS[month]
+        out[:, col_map['DayOfYear_sin']] = _DOY_SIN[day_of_year]
+        out[:, col_map['DayOfYear_cos']] = _DOY_COS[day_of_year]
+        out[:, col_map['DayOfWeek_sin']] = _DOW_SIN[day_of_week]
+        out[:, col_map['DayOfWeek_cos']] = _DOW_COS[day_of_week]
+
+        # 18: Time of day
+        out[:, col_map['TimeOfDay']] = hour + minute / 60
+
+        # 19-26: Time flags
+        out[:, col_map['IsWeekend']] = (day_of_week >= 5).astype(np.float32)
+        out[:, col_map['IsPeakMorning']] = ((hour >= 7) & (hour <= 9)).astype(np.float32)
+        out[:, col_map['IsPeakEvening']] = ((hour >= 18) & (hour <= 21)).astype(np.float32)
+        out[:, col_map['IsPeakHour']] = (((hour >= 7) & (hour <= 9)) | ((hour >= 18) & (hour <= 21))).astype(np.float32)
+        out[:, col_map['IsWorkingHour']] = ((hour >= 8) & (hour <= 17)).astype(np.float32)
+        out[:, col_map['IsNight']] = ((hour < 6) | (hour >= 22)).astype(np.float32)
+        out[:, col_map['IsSleepTime']] = ((hour >= 23) | (hour < 6)).astype(np.float32)
+        out[:, col_map['Season']] = (month % 12 + 3) // 3
+
+        # 27-28: Within hour stats
+        out[:, col_map['Within_Hour_Std']] = base_consumption * 0.05
+        out[:, col_map['Within_Hour_Range']] = base_consumption * 0.1
+
+        # 29-37: Lag features (محاكاة من أنماط متوقعة)
+        out[:, col_map['Consumption_Lag1h']] = base_consumption * 0.98
+        out[:, col_map['Consumption_Lag2h']] = base_consumption * 0.96
+        out[:, col_map['Consumption_Lag3h']] = base_consumption * 0.94
+        out[:, col_map['Consumption_Lag6h']] = base_consumption * 0.90
+        out[:, col_map['Consumption_Lag12h']] = base_consumption * 0.85
+        out[:, col_map['Consumption_Lag24h']] = base_consumption * 0.95  # نفس الساعة أمس
+        out[:, col_map['Consumption_Lag48h']] = base_consumption * 0.93
+        out[:, col_map['Consumption_Lag72h']] = base_consumption * 0.91
+        out[:, col_map['Consumption_Lag168h']] = base_consumption * 0.94  # نفس اليوم الأسبوع الماضي
+
+        # 38-58: Moving averages and statistics
+        out[:, col_map['Consumption_MA3h']] = base_consumption * 0.99
+        out[:, col_map['Consumption_MA6h']] = base_consumption * 0.98
+        out[:, col_map['Consumption_Std6h']] = base_consumption * 0.08
+        out[:, col_map['Consumption_MA12h']] = base_consumption * 0.97
+        out[:, col_map['Consumption_Std12h']] = base_consumption * 0.10
+        out[:, col_map['Consumption_MA24h']] = base_consumption * 0.96
+        out[:, col_map['Consumption_Std24h']] = base_consumption * 0.12
+        out[:, col_map['Consumption_Max24h']] = base_consumption * 1.25
+        out[:, col_map['Consumption_Min24h']] = base_consumption * 0.75
+        out[:, col_map['Consumption_MA48h']] = base_consumption * 0.95
+        out[:, col_map['Consumption_Std48h']] = base_consumption * 0.13
+        out[:, col_map['Consumption_Max48h']] = base_consumption * 1.30
+        out[:, col_map['Consumption_Min48h']] = base_consumption * 0.70
+        out[:, col_map['Consumption_MA72h']] = base_consumption * 0.94
+        out[:, col_map['Consumption_Std72h']] = base_consumption * 0.14
+        out[:, col_map['Consumption_Max72h']] = base_consumption * 1.35
+        out[:, col_map['Consumption_Min72h']] = base_consumption * 0.68
+        out[:, col_map['Consumption_MA168h']] = base_consumption * 0.93
+        out[:, col_map['Consumption_Std168h']] = base_consumption * 0.15
+        out[:, col_map['Consumption_Max168h']] = base_consumption * 1.40
+        out[:, col_map['Consumption_Min168h']] = base_consumption * 0.65
+
+        # 59-64: Delta and trend features
+        out[:, col_map['Consumption_Delta1h']] = base_consumption * 0.02
+        out[:, col_map['Consumption_Delta3h']] = base_consumption * 0.04
+        out[:, col_map['Consumption_Delta6h']] = base_consumption * 0.06
+        out[:, col_map['Consumption_Delta24h']] = base_consumption * 0.03
+        out[:, col_map['Consumption_Trend6h']] = np.where((hour >= 6) & (hour <= 12), 0.01, -0.01)
+        out[:, col_map['Consumption_Trend24h']] = np.full(len(idx), 0.005)
+
+        # 65-74: Aggregated statistics
+        out[:, col_map['DailyMean']] = daily_mean
+        out[:, col_map['DailyStd']] = daily_mean * 0.15
+        out[:, col_map['DailyMax']] = daily_mean * 1.30
+        out[:, col_map['DailyMin']] = daily_mean * 0.70
+        out[:, col_map['WeeklyMean']] = weekly_mean
+        out[:, col_map['WeeklyStd']] = weekly_mean * 0.18
+        out[:, col_map['HourlyMean']] = hourly_mean
+        out[:, col_map['HourlyStd']] = hourly_mean * 0.12
+        out[:, col_map['MonthlyMean']] = monthly_mean
+        out[:, col_map['DayOfWeekMean']] = dayofweek_mean
+
         # 75-78: Ratio features
-        features.update({
-            'DayOfWeekStd': dayofweek_mean * 0.20,
-            'Consumption_to_DailyMean': base_consumption / daily_mean,
-            'Consumption_to_HourlyMean': base_consumption / hourly_mean,
-            'Consumption_to_WeeklyMean': base_consumption / weekly_mean,
-        })
-        
+        out[:, col_map['DayOfWeekStd']] = dayofweek_mean * 0.20
+        out[:, col_map['Consumption_to_DailyMean']] = base_consumption / daily_mean
+        out[:, col_map['Consumption_to_HourlyMean']] = base_consumption / hourly_mean
+        out[:, col_map['Consumption_to_WeeklyMean']] = base_consumption / weekly_mean
+
         # 79-81: Same hour comparisons
-        features.update({
-            'SameHourYesterday': base_consumption * 0.95,
-            'SameHourLastWeek': base_consumption * 0.94,
-            'SameHour2DaysAgo': base_consumption * 0.93,
-        })
-        
+        out[:, col_map['SameHourYesterday']] = base_consumption * 0.95
+        out[:, col_map['SameHourLastWeek']] = base_consumption * 0.94
+        out[:, col_map['SameHour2DaysAgo']] = base_consumption * 0.93
+
         # 82-83: Change rates
-        features.update({
-            'ChangeRate_1h': 0.02,
-            'ChangeRate_6h': 0.05,
-        })
-        
-        return features
-    
-    def _generate_weather(self, hour, day_of_year):
-        """توليد بيانات طقس محاكاة"""
-        # Solar radiation
-        if 6 <= hour <= 18:
-            radiation = 800 * np.sin((hour - 6) * np.pi / 12) + np.random.uniform(-50, 50)
-            radiation = max(0, radiation)
-            sunshine = radiation / 10
-        else:
-            radiation = 0
-            sunshine = 0
-        
-        # Temperature (seasonal variation)
-        base_temp = 20 + 10 * np.sin(2 * np.pi * day_of_year / 365)
-        temp = base_temp + 5 * np.sin((hour - 6) * np.pi / 12)  # daily variation
-        temp += np.random.uniform(-2, 2)
-        
+        out[:, col_map['ChangeRate_1h']] = np.full(len(idx), 0.02)
+        out[:, col_map['ChangeRate_6h']] = np.full(len(idx), 0.05)
+
+        return out
+
+    def _generate_weather_batch(self, hour, day_of_year):
+        """توليد بيانات طقس محاكاة لدفعة كاملة من الساعات"""
+        n = len(hour)
+        day_mask = (hour >= 6) & (hour <= 18)
+
+        # الجزء الحتمي يُحسب في نواة واحدة (gufunc عند توفر numba)
+        radiation_base, temp_base, humidity_base = _weather_trig_batch(
+            np.asarray(hour, dtype=np.int64), np.asarray(day_of_year, dtype=np.int64))
+
+        # Solar radiation — عمليات in-place على buffer الضجيج نفسه بلا temporaries
+        radiation = self._rng.uniform(-50, 50, n)
+        radiation += radiation_base
+        radiation[~day_mask] = 0.0
+        np.maximum(radiation, 0.0, out=radiation)
+        sunshine = radiation * 0.1  # صفر ليلاً لأن radiation صفر أصلاً
+
+        # Temperature (seasonal + daily variation)
+        temp = self._rng.uniform(-2, 2, n)
+        temp += temp_base
+
         # Other weather
-        humidity = 50 + 20 * np.sin(2 * np.pi * day_of_year / 365) + np.random.uniform(-10, 10)
-        humidity = np.clip(humidity, 20, 90)
-        
-        wind_speed = 3 + np.random.uniform(-1, 2)
-        wind_speed = max(0, wind_speed)
-        
-        pressure = 1013 + np.random.uniform(-10, 10)
-        
+        humidity = self._rng.uniform(-10, 10, n)
+        humidity += humidity_base
+        np.clip(humidity, 20, 90, out=humidity)
+
+        wind_speed = self._rng.uniform(-1, 2, n)
+        wind_speed += 3.0
+        np.maximum(wind_speed, 0.0, out=wind_speed)
+
+        pressure = self._rng.uniform(-10, 10, n)
+        pressure += 1013.0
+
         return {
             'radiation': radiation,
             'temperature': temp,
@@ -366,61 +463,12 @@ class FeatureEngineer:
             'pressure': pressure,
             'sunshine': sunshine
         }
-    
-    def _calculate_sun_elevation(self, hour, day_of_year):
-        """حساب ارتفاع الشمس (محاكاة مبسطة)"""
-        if 6 <= hour <= 18:
-            # Peak at noon
-            elevation = 60 * np.sin((hour - 6) * np.pi / 12)
-            # Seasonal adjustment
-            seasonal_factor = np.sin(2 * np.pi * (day_of_year - 80) / 365)
-            elevation += seasonal_factor * 20
-            return max(0, elevation)
-        return 0
-    
-    def _calculate_sun_azimuth(self, hour, day_of_year):
-        """حساب اتجاه الشمس (محاكاة)"""
-        if 6 <= hour <= 18:
-            # East (90) at sunrise, South (180) at noon, West (270) at sunset
-            azimuth = 90 + 180 * (hour - 6) / 12
-            return azimuth
-        return 0
-    
-    def _calculate_air_mass(self, sun_elevation):
-        """حساب Air Mass"""
-        if sun_elevation > 0:
-            # Simplified Kasten-Young formula
-            elevation_rad = math.radians(sun_elevation)
-            am = 1 / (np.sin(elevation_rad) + 0.50572 * (6.07995 + sun_elevation) ** (-1.6364))
-            return min(am, 10)
-        return 10
-    
-    def _estimate_consumption(self, hour, day_of_week):
-        """تقدير استهلاك بناءً على الوقت"""
-        # Base consumption patterns
-        if 0 <= hour < 6:  # Night (low)
-            base = 150
-        elif 6 <= hour < 9:  # Morning peak
-            base = 400
-        elif 9 <= hour < 12:  # Late morning
-            base = 300
-        elif 12 <= hour < 14:  # Lunch
-            base = 350
-        elif 14 <= hour < 18:  # Afternoon
-            base = 280
-        elif 18 <= hour < 22:  # Evening peak
-            base = 450
-        else:  # Late night
-            base = 200
-        
-        # Weekend adjustment
-        if day_of_week >= 5:
-            base *= 1.1  # Higher on weekends
-        
-        # Add randomness
-        base += np.random.uniform(-30, 30)
-        
-        return max(150, base)
+
+    def _estimate_consumption_batch(self, hour, day_of_week):
+        """تقدير استهلاك لدفعة كاملة بناءً على الوقت"""
+        base = _CONSUMPTION_BASE[hour] * np.where(day_of_week >= 5, 1.1, 1.0)
+        base += self._rng.uniform(-30, 30, len(hour))
+        return np.maximum(base, 150.0)
 
 
 class AIModelIntegration:
@@ -437,10 +485,16 @@ class AIModelIntegration:
         print("="*70)
         self.pv_model_data = self._load_model(pv_model_path, "PV Power Model")
         self.consumption_model_data = self._load_model(consumption_model_path, "Consumption Model")
+
+        # خريطة feature → column index (تُحسب مرة واحدة)
+        self.pv_cols = {name: i for i, name in enumerate(self.pv_model_data['features'] or [])}
+        self.cons_cols = {name: i for i, name in enumerate(self.consumption_model_data['features'] or [])}
         
         print("\n" + "="*70)
         print("STEP 2: Creating Database")
         print("="*70)
+        # اتصال واحد دائم — يحافظ على page cache بين عمليات الكتابة
+        self.conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
         self._create_database()
     
     def _load_model(self, path, name):
@@ -466,16 +520,33 @@ class AIModelIntegration:
             
             print(f"   Status: Loaded successfully")
             print(f"   Model Type: {type(model).__name__}")
-            
-            return {'model': model, 'scaler': model_data.get('scaler'), 'features': model_data.get('features')}
-        
-        return {'model': model_data, 'scaler': None, 'features': None}
+
+            # StandardScaler يُختزل إلى معاملي تحويل خطّي — بلا استدعاء transform لاحقاً
+            scaler = model_data.get('scaler')
+            scale_mean = scale_inv = None
+            if scaler is not None and hasattr(scaler, 'mean_') and hasattr(scaler, 'scale_'):
+                scale_mean = np.asarray(scaler.mean_, dtype=np.float32)
+                scale_inv = (1.0 / np.asarray(scaler.scale_)).astype(np.float32)
+                scaler = None  # تحرير مرجع الـ scaler بعد استخراج المعاملات
+
+            return {'model': model, 'scaler': scaler,
+                    'scale_mean': scale_mean, 'scale_inv': scale_inv,
+                    'features': model_data.get('features'),
+                    # يُفحص مرة واحدة هنا: هل يشترط النموذج أسماء أعمدة؟
+                    'needs_frame': hasattr(model, 'feature_names_in_')}
+
+        return {'model': model_data, 'scaler': None,
+                'scale_mean': None, 'scale_inv': None, 'features': None,
+                'needs_frame': hasattr(model_data, 'feature_names_in_')}
     
     def _create_database(self):
         """إنشاء قاعدة البيانات"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        cursor = self.conn.cursor()
+
+        # WAL + synchronous=NORMAL: commit واحد = fsync واحد
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS predictions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -512,10 +583,7 @@ class AIModelIntegration:
                 timestamp TEXT
             )
         ''')
-        
-        conn.commit()
-        conn.close()
-        
+
         print(f"\n✅ Database created: {self.db_path}")
         print("   Tables: predictions, current_data, devices")
     
@@ -525,76 +593,68 @@ class AIModelIntegration:
         print(f"STEP 3: Generating {hours} Hour Predictions with Full Features")
         print("="*70)
         
-        predictions = []
-        current_time = datetime.now()
-        
+        # DatetimeIndex واحد لكل الأفق — لا parsing ولا Timestamp لكل ساعة
+        times = pd.date_range(pd.Timestamp.now().floor('h'), periods=hours, freq='h')
+        ts_strings = times.strftime('%Y-%m-%d %H:%M:%S')
+
         success_count = 0
         error_count = 0
-        
-        for hour_offset in range(hours):
-            pred_time = current_time + timedelta(hours=hour_offset)
-            timestamp = pred_time.strftime('%Y-%m-%d %H:%M:%S')
-            
-            # Create PV features
-            pv_features_dict = self.feature_engineer.create_pv_features(timestamp)
-            
-            # Create Consumption features
-            cons_features_dict = self.feature_engineer.create_consumption_features(timestamp)
-            
-            # Convert to DataFrame with correct column order
-            try:
-                pv_feature_names = self.pv_model_data['features']
-                pv_features_df = pd.DataFrame([[pv_features_dict[f] for f in pv_feature_names]], 
-                                               columns=pv_feature_names)
-                
-                # Scale if scaler exists
-                if self.pv_model_data['scaler'] is not None:
-                    pv_features_df = pd.DataFrame(
-                        self.pv_model_data['scaler'].transform(pv_features_df),
-                        columns=pv_feature_names
-                    )
-                
-                pv_power = self.pv_model_data['model'].predict(pv_features_df)[0]
-                pv_power = max(0, float(pv_power))
-                success_count += 1
-            except Exception as e:
-                if error_count == 0:  # Print only first error
-                    print(f"   ⚠️  PV prediction error: {e}")
-                pv_power = 0
-                error_count += 1
-            
-            # Consumption prediction
-            try:
-                cons_feature_names = self.consumption_model_data['features']
-                cons_features_df = pd.DataFrame([[cons_features_dict[f] for f in cons_feature_names]], 
-                                                 columns=cons_feature_names)
-                
-                if self.consumption_model_data['scaler'] is not None:
-                    cons_features_df = pd.DataFrame(
-                        self.consumption_model_data['scaler'].transform(cons_features_df),
-                        columns=cons_feature_names
-                    )
-                
-                consumption = self.consumption_model_data['model'].predict(cons_features_df)[0]
-                consumption = max(150, float(consumption))
-            except Exception as e:
-                if error_count == 0:
-                    print(f"   ⚠️  Consumption prediction error: {e}")
-                consumption = 200
-            
-            surplus = max(0, pv_power - consumption)
-            deficit = max(0, consumption - pv_power)
-            
-            predictions.append({
-                'timestamp': timestamp,
-                'hour': pred_time.hour,
-                'pv_power': round(pv_power, 2),
-                'consumption': round(consumption, 2),
-                'surplus': round(surplus, 2),
-                'deficit': round(deficit, 2)
-            })
-        
-        print(f"✅ Generated {len(predictions)} predictions")
+
+        # ===== PV prediction (one batched model call) =====
+        try:
+            pv_X = self.feature_engineer.create_pv_features_batch(times, self.pv_cols)
+
+            # التحجيم كعمليتين in-place على نفس الـ buffer — بلا نسخ أو فحوصات sklearn
+            if self.pv_model_data['scale_mean'] is not None:
+                np.subtract(pv_X, self.pv_model_data['scale_mean'], out=pv_X)
+                np.multiply(pv_X, self.pv_model_data['scale_inv'], out=pv_X)
+            elif self.pv_model_data['scaler'] is not None:
+                pv_X = self.pv_model_data['scaler'].transform(pv_X)
+
+            # إن اشترط النموذج أسماء أعمدة: DataFrame واحد للدفعة كلها بلا نسخ
+            if self.pv_model_data['needs_frame']:
+                pv_X = pd.DataFrame(pv_X, columns=self.pv_model_data['features'], copy=False)
+
+            pv_power = np.maximum(self.pv_model_data['model'].predict(pv_X), 0.0)
+            success_count = hours
+        except Exception as e:
+            print(f"   ⚠️  PV prediction error: {e}")
+            pv_power = np.zeros(hours)
+            error_count = hours
+
+        # ===== Consumption prediction (one batched model call) =====
+        try:
+            cons_X = self.feature_engineer.create_consumption_features_batch(times, self.cons_cols)
+
+            if self.consumption_model_data['scale_mean'] is not None:
+                np.subtract(cons_X, self.consumption_model_data['scale_mean'], out=cons_X)
+                np.multiply(cons_X, self.consumption_model_data['scale_inv'], out=cons_X)
+            elif self.consumption_model_data['scaler'] is not None:
+                cons_X = self.consumption_model_data['scaler'].transform(cons_X)
+
+            if self.consumption_model_data['needs_frame']:
+                cons_X = pd.DataFrame(cons_X, columns=self.consumption_model_data['features'], copy=False)
+
+            consumption = np.maximum(self.consumption_model_data['model'].predict(cons_X), 150.0)
+        except Exception as e:
+            print(f"   ⚠️  Consumption prediction error: {e}")
+            consumption = np.full(hours, 200.0)
+
+        surplus = np.maximum(pv_power - consumption, 0.0)
+        deficit = np.maximum(consumption - pv_power, 0.0)
+
+        # النتائج كـ structure-of-arrays — ذاكرة متجاورة بلا 24 dict وسيطة
+        predictions = {
+            'timestamp': ts_strings.tolist(),
+            'hour': times.hour.values.tolist(),
+            'pv_power': np.round(pv_power, 2).tolist(),
+            'consumption': np.round(consumption, 2).tolist(),
+            'surplus': np.round(surplus, 2).tolist(),
+            'deficit': np.round(deficit, 2).tolist(),
+        }
+        self.last_predictions = predictions
+
+        print(f"✅ Generated {hours} predictions")
         print(f"   Successful: {success_count}, Errors: {error_count}")
         return predictions
     
@@ -604,29 +664,42 @@ class AIModelIntegration:
         print("STEP 4: Saving to Database")
         print("="*70)
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        for pred in predictions:
-            cursor.execute('''
-                INSERT OR REPLACE INTO predictions
-                (timestamp, hour, pv_power, consumption, surplus, deficit, battery_soc)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (pred['timestamp'], pred['hour'], pred['pv_power'], 
-                  pred['consumption'], pred['surplus'], pred['deficit'], 70.0))
-        
-        current = predictions[0]
+        cursor = self.conn.cursor()
+
+        # عبارة واحدة مُجهّزة + معاملة واحدة لكل الدفعة
+        cursor.execute('BEGIN IMMEDIATE')
+        n = len(predictions['timestamp'])
+        cursor.executemany('''
+            INSERT OR REPLACE INTO predictions
+            (timestamp, hour, pv_power, consumption, surplus, deficit, battery_soc)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', zip(predictions['timestamp'], predictions['hour'], predictions['pv_power'],
+                 predictions['consumption'], predictions['surplus'], predictions['deficit'],
+                 [70.0] * n))
+
         cursor.execute('''
             INSERT OR REPLACE INTO current_data
             (id, timestamp, pv_power, consumption, battery_soc, grid_power, system_efficiency)
             VALUES (1, ?, ?, ?, ?, ?, ?)
-        ''', (current['timestamp'], current['pv_power'], current['consumption'], 70.0, 0, 92.0))
-        
-        conn.commit()
-        conn.close()
-        
-        print(f"✅ Saved {len(predictions)} predictions to database")
+        ''', (predictions['timestamp'][0], predictions['pv_power'][0],
+              predictions['consumption'][0], 70.0, 0, 92.0))
+
+        self.conn.commit()
+
+        print(f"✅ Saved {n} predictions to database")
     
+    def close(self):
+        """إغلاق اتصال قاعدة البيانات"""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
     def display_summary(self, predictions):
         """عرض ملخص"""
         print("\n" + "="*70)
@@ -635,10 +708,12 @@ class AIModelIntegration:
         print(f"\n{'Time':<20} {'PV (W)':<12} {'Consumption (W)':<18} {'Net (W)':<12}")
         print("-"*70)
         
-        for pred in predictions[:12]:
-            net = pred['pv_power'] - pred['consumption']
+        for i in range(min(12, len(predictions['timestamp']))):
+            pv = predictions['pv_power'][i]
+            cons = predictions['consumption'][i]
+            net = pv - cons
             status = "SURPLUS" if net > 0 else "DEFICIT"
-            print(f"{pred['timestamp']:<20} {pred['pv_power']:<12.1f} {pred['consumption']:<18.1f} {net:<12.1f} {status}")
+            print(f"{predictions['timestamp'][i]:<20} {pv:<12.1f} {cons:<18.1f} {net:<12.1f} {status}")
     
     def run_integration(self):
         """تشغيل كامل"""
@@ -650,8 +725,8 @@ class AIModelIntegration:
         print("✅ INTEGRATION COMPLETE")
         print("="*70)
         print(f"\n📊 Current Data:")
-        print(f"   PV Power: {predictions[0]['pv_power']:.1f} W")
-        print(f"   Consumption: {predictions[0]['consumption']:.1f} W")
+        print(f"   PV Power: {predictions['pv_power'][0]:.1f} W")
+        print(f"   Consumption: {predictions['consumption'][0]:.1f} W")
         
         print(f"\n📁 Database: {self.db_path}")
         print("\n🚀 Next Steps:")
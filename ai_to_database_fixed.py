@@ -7,10 +7,68 @@ Handles different model formats (dict, sklearn model, etc.)
 import sqlite3
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 import joblib
+import json
 import os
 
+# تفعيل نواة Intel المسرَّعة لاستدلال sklearn إن كانت متوفرة — يجب أن يسبق joblib.load
+try:
+    from sklearnex import patch_sklearn
+    patch_sklearn(verbose=False)
+except ImportError:
+    pass
+
+# ONNX Runtime اختياري — مسار predict مُجمَّع أسرع من sklearn للنماذج الشجرية
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+# numba اختياري: نواة توليد الطقس تُجمَّع إلى كود آلة إن توفّر
+try:
+    from numba import njit as _njit
+except ImportError:
+    _njit = None
+
+
+def _weather_base(hour, dayofyear):
+    """الأساس الحتمي للطقس: إشعاع نهاري جيبي + حرارة موسمية + قناع النهار"""
+    day_mask = (hour >= 6) & (hour <= 18)
+    irradiance = np.where(day_mask, 800 * np.sin((hour - 6) * np.pi / 12), 0.0)
+    temperature = 20 + 10 * np.sin(2 * np.pi * dayofyear / 365)
+    return irradiance, temperature, day_mask
+
+
+if _njit is not None:
+    @_njit(cache=True, fastmath=True)
+    def _weather_base(hour, dayofyear):  # noqa: F811 — نسخة مُجمَّعة تحل محل numpy
+        n = hour.shape[0]
+        irradiance = np.zeros(n)
+        temperature = np.empty(n)
+        day_mask = np.empty(n, dtype=np.bool_)
+        for i in range(n):
+            h = hour[i]
+            day = 6 <= h <= 18
+            day_mask[i] = day
+            if day:
+                irradiance[i] = 800.0 * np.sin((h - 6) * np.pi / 12.0)
+            temperature[i] = 20.0 + 10.0 * np.sin(2.0 * np.pi * dayofyear[i] / 365.0)
+        return irradiance, temperature, day_mask
+
+
+class _OnnxModel:
+    """غلاف يعرض predict() فوق جلسة ONNX Runtime"""
+
+    def __init__(self, path):
+        self._sess = ort.InferenceSession(path, providers=['CPUExecutionProvider'])
+        self._input = self._sess.get_inputs()[0].name
+
+    def predict(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        return self._sess.run(None, {self._input: X})[0].ravel()
+
 # ============================================================================
 # STEP 1: ضع مسار نماذجك هنا
 # ============================================================================
@@ -22,14 +80,112 @@ DATABASE_PATH = 'smart_house.db'
 # ============================================================================
 
 
+# نص ثابت للعبارات الساخنة — sqlite3 يعيد استخدام العبارة المُجهّزة من كاشه
+# UPSERT بدل INSERT OR REPLACE: تحديث في المكان بدل DELETE+INSERT وإعادة بناء الفهارس
+_SQL_INSERT_PRED = '''
+    INSERT INTO predictions
+    (timestamp, hour, pv_power, consumption, surplus, deficit, battery_soc)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(timestamp) DO UPDATE SET
+        hour=excluded.hour, pv_power=excluded.pv_power,
+        consumption=excluded.consumption, surplus=excluded.surplus,
+        deficit=excluded.deficit, battery_soc=excluded.battery_soc
+'''
+
+_SQL_UPSERT_CURRENT = '''
+    INSERT INTO current_data
+    (id, timestamp, pv_power, consumption, battery_soc, grid_power, system_efficiency)
+    VALUES (1, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        timestamp=excluded.timestamp, pv_power=excluded.pv_power,
+        consumption=excluded.consumption, battery_soc=excluded.battery_soc,
+        grid_power=excluded.grid_power, system_efficiency=excluded.system_efficiency
+'''
+
+
+# كاش جانبي يتذكر أين يقبع النموذج داخل كل pkl — يجعل التحميل حتمياً ويتخطى الاستكشاف
+_MODEL_KEY_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'smart_home_models.json')
+
+
+def _read_key_cache():
+    try:
+        with open(_MODEL_KEY_CACHE, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_key_cache(cache):
+    try:
+        os.makedirs(os.path.dirname(_MODEL_KEY_CACHE), exist_ok=True)
+        with open(_MODEL_KEY_CACHE, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+    except OSError:
+        pass
+
+
+def _get_by_path(model_data, key_path):
+    """الوصول المباشر عبر مسار مفاتيح منقوط مثل 'models.RandomForest'"""
+    obj = model_data
+    for seg in key_path.split('.'):
+        obj = obj[int(seg)] if isinstance(obj, (list, tuple)) else obj[seg]
+    return obj
+
+
+def _resolve_model(model_data):
+    """استكشاف موضع النموذج داخل الـ dict — يعيد (key_path, model)"""
+    if 'model' in model_data:
+        return 'model', model_data['model']
+    if 'models' in model_data:
+        models = model_data['models']
+        if isinstance(models, dict):
+            best = model_data.get('best_model_name')
+            key = best if best in models else next(iter(models))
+            return f'models.{key}', models[key]
+        if isinstance(models, (list, tuple)):
+            return 'models.0', models[0]
+        return 'models', models
+    if 'estimator' in model_data:
+        return 'estimator', model_data['estimator']
+    # استخدم أول قيمة تبدو أنها نموذج
+    for key, value in model_data.items():
+        if hasattr(value, 'predict'):
+            return key, value
+    raise ValueError(f"Could not find model in dictionary. Keys: {list(model_data.keys())}")
+
+
+def _configure(conn):
+    """ضبط PRAGMAs للأداء — WAL دائم + مزامنة NORMAL (آمنة تحت WAL)"""
+    conn.executescript('''
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-20000;
+    ''')
+
+
 class AIModelIntegration:
     """ربط نماذج الذكاء الاصطناعي مع قاعدة البيانات"""
-    
+
+    PV_FEATURE_COLS = ['irradiance', 'temperature', 'humidity',
+                       'wind_speed', 'hour', 'dayofyear']
+    CONS_FEATURE_COLS = ['hour', 'day_of_week', 'month', 'is_weekend', 'temperature']
+
     def __init__(self, pv_model_path, consumption_model_path, db_path):
         self.pv_model_path = pv_model_path
         self.consumption_model_path = consumption_model_path
         self.db_path = db_path
-        
+
+        # Buffers مُعاد استخدامها لمصفوفات الـ features — تُخصَّص عند أول تنبؤ
+        self._pv_buf = None
+        self._cons_buf = None
+
+        # مولّد عشوائي حديث — سحبة واحدة لكل دفعة بدل نداء لكل ساعة
+        self._rng = np.random.default_rng()
+
+        # النموذجان مستقلان — predict لكليهما بالتوازي (sklearn يحرر الـ GIL)
+        self._pool = ThreadPoolExecutor(max_workers=2)
+
         # تحميل النماذج
         print("="*70)
         print("STEP 1: Loading AI Models")
@@ -52,43 +208,46 @@ class AIModelIntegration:
         print(f"\n✅ {name}")
         print(f"   Path: {path}")
         print(f"   Size: {size_mb:.1f} MB")
-        
-        model_data = joblib.load(path)
+
+        # إن وُجد تصدير ONNX بجوار الـ pkl فاستخدمه (أسرع استدلالاً) — sklearn كخطة بديلة
+        onnx_path = os.path.splitext(path)[0] + '.onnx'
+        if ort is not None and os.path.exists(onnx_path):
+            print(f"   Using ONNX Runtime: {onnx_path}")
+            return _OnnxModel(onnx_path)
+
+        # إيحاء للنظام بقراءة الملف مسبقاً (غير متوفر على Windows)
+        try:
+            fd = os.open(path, os.O_RDONLY)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            os.close(fd)
+        except (AttributeError, OSError):
+            pass
+
+        # mmap: مصفوفات الأشجار تُحمَّل صفحة صفحة عند الحاجة وتُشارَك بين الـ workers
+        model_data = joblib.load(path, mmap_mode='r')
         
         # التعامل مع أنواع مختلفة من النماذج
         if isinstance(model_data, dict):
             print(f"   Type: Dictionary (extracting model)")
             print(f"   Keys found: {list(model_data.keys())}")
-            
-            # إذا كان dictionary، ابحث عن النموذج داخله
-            if 'model' in model_data:
-                model = model_data['model']
-            elif 'models' in model_data:
-                # إذا كان ensemble من نماذج متعددة
-                models = model_data['models']
-                if isinstance(models, dict):
-                    # استخدم أفضل نموذج إذا كان محدد
-                    if 'best_model_name' in model_data and model_data['best_model_name'] in models:
-                        model = models[model_data['best_model_name']]
-                        print(f"   Using best model: {model_data['best_model_name']}")
-                    else:
-                        # استخدم أول نموذج
-                        model = list(models.values())[0]
-                        print(f"   Using first model: {list(models.keys())[0]}")
-                elif isinstance(models, list):
-                    model = models[0]
-                else:
-                    model = models
-            elif 'estimator' in model_data:
-                model = model_data['estimator']
-            else:
-                # استخدم أول قيمة تبدو أنها نموذج
-                for key, value in model_data.items():
-                    if hasattr(value, 'predict'):
-                        model = value
-                        break
-                else:
-                    raise ValueError(f"Could not find model in dictionary. Keys: {list(model_data.keys())}")
+
+            # المسار المحفوظ من تشغيل سابق يتخطى الاستكشاف كله
+            cache = _read_key_cache()
+            abs_path = os.path.abspath(path)
+            key_path = cache.get(abs_path)
+            model = None
+            if key_path is not None:
+                try:
+                    model = _get_by_path(model_data, key_path)
+                except (KeyError, IndexError, ValueError, TypeError):
+                    key_path = None  # بنية الملف تغيّرت — أعد الاستكشاف
+
+            if key_path is None:
+                key_path, model = _resolve_model(model_data)
+                cache[abs_path] = key_path
+                _write_key_cache(cache)
+
+            print(f"   Using: {key_path}")
         else:
             model = model_data
         
@@ -104,8 +263,9 @@ class AIModelIntegration:
     def _create_database(self):
         """إنشاء جداول قاعدة البيانات"""
         conn = sqlite3.connect(self.db_path)
+        _configure(conn)
         cursor = conn.cursor()
-        
+
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS predictions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -142,7 +302,22 @@ class AIModelIntegration:
                 timestamp TEXT
             )
         ''')
-        
+
+        # فهرس مُغطٍّ لاستعلامات التوقعات (ORDER BY timestamp ... LIMIT 24):
+        # مسح فهرس فقط بلا رجوع للجدول الرئيسي
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_pred_ts_covering
+            ON predictions(timestamp DESC, pv_power, consumption, surplus, deficit,
+                           hour, battery_soc)
+        ''')
+        cursor.execute('ANALYZE predictions')
+
+        # فهرس "آخر قراءة لكل جهاز" — يخدم ROW_NUMBER() OVER (PARTITION BY device_name)
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_devices_name_ts
+            ON devices(device_name, timestamp DESC)
+        ''')
+
         conn.commit()
         conn.close()
         
@@ -155,66 +330,85 @@ class AIModelIntegration:
         print(f"STEP 3: Generating {hours} Hour Predictions")
         print("="*70)
         
-        predictions = []
-        current_time = datetime.now()
-        
-        for hour_offset in range(hours):
-            pred_time = current_time + timedelta(hours=hour_offset)
-            hour = pred_time.hour
-            dayofyear = pred_time.timetuple().tm_yday
-            day_of_week = pred_time.weekday()
-            month = pred_time.month
-            is_weekend = 1 if day_of_week >= 5 else 0
-            
-            # توليد بيانات الطقس (في الإنتاج: استخدم Weather API)
-            if 6 <= hour <= 18:
-                irradiance = 800 * np.sin((hour - 6) * np.pi / 12)
-                irradiance = max(0, irradiance + np.random.uniform(-50, 50))
-            else:
-                irradiance = 0
-            
-            temperature = 20 + 10 * np.sin(2 * np.pi * dayofyear / 365)
-            temperature += np.random.uniform(-2, 2)
-            humidity = np.random.uniform(40, 70)
-            wind_speed = np.random.uniform(1, 5)
-            
-            # ===== PV Prediction =====
-            try:
-                pv_features = pd.DataFrame([[
-                    irradiance, temperature, humidity, wind_speed, hour, dayofyear
-                ]], columns=['irradiance', 'temperature', 'humidity', 'wind_speed', 'hour', 'dayofyear'])
-                
-                pv_power = self.pv_model.predict(pv_features)[0]
-                pv_power = max(0, float(pv_power))
-            except Exception as e:
-                print(f"   ⚠️  PV prediction error (hour {hour}): {e}")
-                pv_power = 0
-            
-            # ===== Consumption Prediction =====
-            try:
-                cons_features = pd.DataFrame([[
-                    hour, day_of_week, month, is_weekend, temperature
-                ]], columns=['hour', 'day_of_week', 'month', 'is_weekend', 'temperature'])
-                
-                consumption = self.consumption_model.predict(cons_features)[0]
-                consumption = max(150, float(consumption))
-            except Exception as e:
-                print(f"   ⚠️  Consumption prediction error (hour {hour}): {e}")
-                consumption = 200
-            
-            # حساب الفائض/العجز
-            surplus = max(0, pv_power - consumption)
-            deficit = max(0, consumption - pv_power)
-            
-            predictions.append({
-                'timestamp': pred_time.strftime('%Y-%m-%d %H:%M:%S'),
-                'hour': hour,
-                'pv_power': round(pv_power, 2),
-                'consumption': round(consumption, 2),
-                'surplus': round(surplus, 2),
-                'deficit': round(deficit, 2)
-            })
-        
+        start = datetime.now().replace(minute=0, second=0, microsecond=0)
+        times = pd.date_range(start, periods=hours, freq='h')
+        # تهيئة كل الطوابع الزمنية بنداء C واحد بدل strftime لكل صف
+        ts_strings = times.strftime('%Y-%m-%d %H:%M:%S').to_numpy()
+        hour = times.hour.values
+        dayofyear = times.dayofyear.values
+        day_of_week = times.dayofweek.values
+        month = times.month.values
+        is_weekend = (day_of_week >= 5).astype(np.int64)
+
+        # توليد بيانات الطقس دفعة واحدة (في الإنتاج: استخدم Weather API)
+        # سحبة عشوائية واحدة (hours, 4): ضجيج الإشعاع والحرارة + الرطوبة والرياح
+        noise = self._rng.uniform(low=[-50.0, -2.0, 40.0, 1.0],
+                                  high=[50.0, 2.0, 70.0, 5.0],
+                                  size=(hours, 4))
+        irradiance, temperature, day_mask = _weather_base(hour, dayofyear)
+        irradiance = np.maximum(0, irradiance + noise[:, 0] * day_mask)
+        temperature = temperature + noise[:, 1]
+        humidity = noise[:, 2]
+        wind_speed = noise[:, 3]
+
+        # Buffers مُعاد استخدامها — الكتابة بالأعمدة بدل column_stack (بلا تخصيص جديد)
+        # float32: الأشجار تعمل به داخلياً — نصف حركة الذاكرة وبلا تحويل داخل predict
+        if self._pv_buf is None or self._pv_buf.shape[0] != hours:
+            self._pv_buf = np.empty((hours, len(self.PV_FEATURE_COLS)), dtype=np.float32)
+            self._cons_buf = np.empty((hours, len(self.CONS_FEATURE_COLS)), dtype=np.float32)
+
+        # ===== بناء مصفوفتي الـ features =====
+        pv_X = self._pv_buf
+        pv_X[:, 0] = irradiance
+        pv_X[:, 1] = temperature
+        pv_X[:, 2] = humidity
+        pv_X[:, 3] = wind_speed
+        pv_X[:, 4] = hour
+        pv_X[:, 5] = dayofyear
+        if hasattr(self.pv_model, 'feature_names_in_'):
+            pv_X = pd.DataFrame(pv_X, columns=self.PV_FEATURE_COLS, copy=False)
+
+        cons_X = self._cons_buf
+        cons_X[:, 0] = hour
+        cons_X[:, 1] = day_of_week
+        cons_X[:, 2] = month
+        cons_X[:, 3] = is_weekend
+        cons_X[:, 4] = temperature
+        if hasattr(self.consumption_model, 'feature_names_in_'):
+            cons_X = pd.DataFrame(cons_X, columns=self.CONS_FEATURE_COLS, copy=False)
+
+        # ===== نداءا predict متوازيان — النموذجان مستقلان =====
+        fut_pv = self._pool.submit(self.pv_model.predict, pv_X)
+        fut_cons = self._pool.submit(self.consumption_model.predict, cons_X)
+
+        try:
+            pv_power = np.maximum(0, fut_pv.result())
+        except Exception as e:
+            print(f"   ⚠️  PV prediction error: {e}")
+            pv_power = np.zeros(hours)
+
+        try:
+            consumption = np.clip(fut_cons.result(), 150, None)
+        except Exception as e:
+            print(f"   ⚠️  Consumption prediction error: {e}")
+            consumption = np.full(hours, 200.0)
+
+        # حساب الفائض/العجز
+        surplus = np.maximum(0, pv_power - consumption)
+        deficit = np.maximum(0, consumption - pv_power)
+
+        predictions = [
+            {
+                'timestamp': t,
+                'hour': int(h),
+                'pv_power': round(float(pv), 2),
+                'consumption': round(float(c), 2),
+                'surplus': round(float(s), 2),
+                'deficit': round(float(d), 2)
+            }
+            for t, h, pv, c, s, d in zip(ts_strings, hour, pv_power, consumption, surplus, deficit)
+        ]
+
         print(f"✅ Generated {len(predictions)} predictions")
         return predictions
     
@@ -225,45 +419,31 @@ class AIModelIntegration:
         print("="*70)
         
         conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        conn.execute('PRAGMA synchronous=NORMAL')
+
+        # دفعة واحدة: عبارة مُجهّزة + معاملة صريحة بدل execute لكل صف
+        rows = [(pred['timestamp'], pred['hour'], pred['pv_power'],
+                 pred['consumption'], pred['surplus'], pred['deficit'], 70.0)
+                for pred in predictions]
+        current = predictions[0]
         saved = 0
-        for pred in predictions:
-            try:
-                cursor.execute('''
-                    INSERT OR REPLACE INTO predictions
-                    (timestamp, hour, pv_power, consumption, surplus, deficit, battery_soc)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    pred['timestamp'],
-                    pred['hour'],
-                    pred['pv_power'],
-                    pred['consumption'],
-                    pred['surplus'],
-                    pred['deficit'],
-                    70.0
+        try:
+            # معاملة واحدة تغطي الجدولين — fsync واحد لكل دورة توقعات
+            with conn:
+                conn.executemany(_SQL_INSERT_PRED, rows)
+                conn.execute(_SQL_UPSERT_CURRENT, (
+                    current['timestamp'],
+                    current['pv_power'],
+                    current['consumption'],
+                    70.0,
+                    0,
+                    92.0
                 ))
-                saved += 1
-            except Exception as e:
-                print(f"    ⚠️  Error saving: {e}")
-        
-        # حفظ البيانات الحالية
-        current = predictions[0]
-        cursor.execute('''
-            INSERT OR REPLACE INTO current_data
-            (id, timestamp, pv_power, consumption, battery_soc, grid_power, system_efficiency)
-            VALUES (1, ?, ?, ?, ?, ?, ?)
-        ''', (
-            current['timestamp'],
-            current['pv_power'],
-            current['consumption'],
-            70.0,
-            0,
-            92.0
-        ))
-        
-        conn.commit()
-        conn.close()
+            saved = len(rows)
+        except Exception as e:
+            print(f"    ⚠️  Error saving: {e}")
+        finally:
+            conn.close()
         
         print(f"✅ Saved {saved} predictions to database")
         print(f"✅ Updated current data for API")
@@ -284,8 +464,9 @@ class AIModelIntegration:
     def get_data_for_api(self):
         """الحصول على البيانات للـ API"""
         conn = sqlite3.connect(self.db_path)
+        conn.execute('PRAGMA synchronous=NORMAL')
         cursor = conn.cursor()
-        
+
         cursor.execute('SELECT * FROM current_data WHERE id = 1')
         current = cursor.fetchone()
         
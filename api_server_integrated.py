@@ -10,9 +10,17 @@ Endpoints:
 - POST /api/update_device     : Update device status
 """
 
-from flask import Flask, jsonify, request, render_template_string
+from flask import Flask, jsonify, request
 from flask_cors import CORS
+
+# orjson يُصدر bytes مباشرة من C — أسرع بكثير من مُرمِّز Flask للحمولات الرقمية
+try:
+    import orjson
+except ImportError:
+    orjson = None
 import sqlite3
+import threading
+import time
 from datetime import datetime
 
 app = Flask(__name__)
@@ -21,17 +29,49 @@ CORS(app)
 DATABASE_PATH = 'smart_house.db'
 
 
+def ojson(payload, status=200):
+    """استجابة JSON عبر orjson إن توفر، مع jsonify كبديل متوافق"""
+    if orjson is None:
+        return jsonify(payload), status
+    return app.response_class(orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY),
+                              mimetype='application/json', status=status)
+
+
+# كاش داخل العملية للاستجابات — التوقعات تتجدد كل ساعة على الأكثر،
+# بينما اللوحة وESP32 يستطلعان كل بضع ثوانٍ
+_CACHE_TTL = {'current': 5.0, 'forecast': 60.0, 'devices': 5.0, 'stats': 60.0,
+              'bootstrap': 5.0}
+_cache = {}
+
+
+def _cache_get(key):
+    entry = _cache.get(key)
+    if entry is not None and time.monotonic() - entry[0] < _CACHE_TTL[key]:
+        return entry[1]
+    return None
+
+
+def _cache_set(key, payload):
+    _cache[key] = (time.monotonic(), payload)
+    return payload
+
+
+_tls = threading.local()
+
+
 def get_db():
-    """الاتصال بقاعدة البيانات"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
+    """اتصال دائم لكل thread — يحافظ على page cache ويتجنب كلفة الفتح لكل طلب"""
+    conn = getattr(_tls, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DATABASE_PATH)
+        # WAL مضبوط بشكل دائم عند إنشاء القاعدة؛ NORMAL آمنة تحته ولا تحجب القرّاء
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.row_factory = sqlite3.Row
+        _tls.conn = conn
     return conn
 
 
-@app.route('/')
-def dashboard():
-    """لوحة التحكم على الويب"""
-    html = """
+_DASHBOARD_HTML = """
 <!DOCTYPE html>
 <html>
 <head>
@@ -170,9 +210,8 @@ def dashboard():
 
         async function fetchData() {
             try {
-                // Fetch current data
-                const currentRes = await fetch('/api/current');
-                const current = await currentRes.json();
+                // One request fetches current data + forecast together
+                const {current, forecast} = await (await fetch('/api/bootstrap')).json();
 
                 // Update stats
                 document.getElementById('solarPower').innerHTML = 
@@ -184,10 +223,6 @@ def dashboard():
                 document.getElementById('efficiency').innerHTML = 
                     current.efficiency.toFixed(1) + '<span class="stat-unit">%</span>';
 
-                // Fetch forecast
-                const forecastRes = await fetch('/api/forecast');
-                const forecast = await forecastRes.json();
-
                 updateChart(forecast);
 
                 // Update timestamp
@@ -257,7 +292,16 @@ def dashboard():
 </body>
 </html>
     """
-    return render_template_string(html)
+
+# القالب لا يحتوي متغيرات Jinja — تُجهَّز البايتات مرة واحدة عند الاستيراد
+# بدل إعادة تحليل القالب في كل GET /
+_DASHBOARD_BYTES = _DASHBOARD_HTML.encode('utf-8')
+
+
+@app.route('/')
+def dashboard():
+    """لوحة التحكم على الويب"""
+    return app.response_class(_DASHBOARD_BYTES, mimetype='text/html')
 
 
 @app.route('/api/current', methods=['GET'])
@@ -278,34 +322,37 @@ def get_current_data():
         }
     """
     try:
+        cached = _cache_get('current')
+        if cached is not None:
+            return ojson(cached)
+
         conn = get_db()
         cursor = conn.cursor()
-        
+
         cursor.execute('SELECT * FROM current_data WHERE id = 1')
         row = cursor.fetchone()
-        conn.close()
-        
+
         if row:
-            return jsonify({
+            return ojson(_cache_set('current', {
                 'timestamp': row['timestamp'],
                 'pv_power': float(row['pv_power']),
                 'consumption': float(row['consumption']),
                 'battery_soc': float(row['battery_soc']),
                 'grid_power': int(row['grid_power']),
                 'efficiency': float(row['system_efficiency'])
-            })
+            }))
         else:
-            return jsonify({
+            return ojson({
                 'error': 'No data available',
                 'pv_power': 0,
                 'consumption': 0,
                 'battery_soc': 70,
                 'grid_power': 0,
                 'efficiency': 0
-            }), 404
+            }, 404)
             
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojson({'error': str(e)}, 500)
 
 
 @app.route('/api/forecast', methods=['GET'])
@@ -318,19 +365,22 @@ def get_forecast():
     JSON: Array of predictions
     """
     try:
+        cached = _cache_get('forecast')
+        if cached is not None:
+            return ojson(cached)
+
         conn = get_db()
         cursor = conn.cursor()
-        
+
         cursor.execute('''
             SELECT timestamp, pv_power, consumption, surplus, deficit
             FROM predictions
             ORDER BY timestamp ASC
             LIMIT 24
         ''')
-        
+
         rows = cursor.fetchall()
-        conn.close()
-        
+
         forecast = []
         for row in rows:
             forecast.append({
@@ -340,11 +390,63 @@ def get_forecast():
                 'surplus': float(row['surplus']),
                 'deficit': float(row['deficit'])
             })
-        
-        return jsonify(forecast)
+
+        return ojson(_cache_set('forecast', forecast))
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojson({'error': str(e)}, 500)
+
+
+@app.route('/api/bootstrap', methods=['GET'])
+def get_bootstrap():
+    """
+    البيانات الحالية + توقعات 24 ساعة في طلب واحد
+
+    تستخدمها لوحة التحكم بدل نداءي /api/current و /api/forecast —
+    نصف عدد الطلبات لكل دورة استطلاع
+    """
+    try:
+        cached = _cache_get('bootstrap')
+        if cached is not None:
+            return ojson(cached)
+
+        conn = get_db()
+        cursor = conn.cursor()
+
+        cursor.execute('SELECT * FROM current_data WHERE id = 1')
+        row = cursor.fetchone()
+        current = None
+        if row:
+            current = {
+                'timestamp': row['timestamp'],
+                'pv_power': float(row['pv_power']),
+                'consumption': float(row['consumption']),
+                'battery_soc': float(row['battery_soc']),
+                'grid_power': int(row['grid_power']),
+                'efficiency': float(row['system_efficiency'])
+            }
+
+        cursor.execute('''
+            SELECT timestamp, pv_power, consumption, surplus, deficit
+            FROM predictions
+            ORDER BY timestamp ASC
+            LIMIT 24
+        ''')
+        forecast = [
+            {
+                'timestamp': row['timestamp'],
+                'pv_power': float(row['pv_power']),
+                'consumption': float(row['consumption']),
+                'surplus': float(row['surplus']),
+                'deficit': float(row['deficit'])
+            }
+            for row in cursor.fetchall()
+        ]
+
+        return ojson(_cache_set('bootstrap', {'current': current, 'forecast': forecast}))
+
+    except Exception as e:
+        return ojson({'error': str(e)}, 500)
 
 
 @app.route('/api/update_device', methods=['POST'])
@@ -379,30 +481,43 @@ def update_device():
         ))
         
         conn.commit()
-        conn.close()
-        
-        return jsonify({'status': 'success', 'message': 'Device updated'})
+
+        # إبطال كاش الأجهزة حتى تظهر الحالة الجديدة فوراً
+        _cache.pop('devices', None)
+
+        return ojson({'status': 'success', 'message': 'Device updated'})
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojson({'error': str(e)}, 500)
 
 
 @app.route('/api/devices', methods=['GET'])
 def get_devices():
     """الحصول على حالة جميع الأجهزة"""
     try:
+        cached = _cache_get('devices')
+        if cached is not None:
+            return ojson(cached)
+
         conn = get_db()
         cursor = conn.cursor()
         
+        # آخر صف لكل جهاز عبر window function — الصيغة القديمة
+        # (bare columns مع MAX/GROUP BY) لا تضمن أن status يأتي من الصف الأحدث
         cursor.execute('''
-            SELECT device_name, status, power_consumption, MAX(timestamp) as latest
-            FROM devices
-            GROUP BY device_name
+            SELECT device_name, status, power_consumption, timestamp AS latest
+            FROM (
+                SELECT device_name, status, power_consumption, timestamp,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY device_name ORDER BY timestamp DESC
+                       ) AS rn
+                FROM devices
+            )
+            WHERE rn = 1
             ORDER BY device_name
         ''')
         
         rows = cursor.fetchall()
-        conn.close()
         
         devices = []
         for row in rows:
@@ -413,16 +528,20 @@ def get_devices():
                 'timestamp': row['latest']
             })
         
-        return jsonify({'devices': devices})
+        return ojson(_cache_set('devices', {'devices': devices}))
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojson({'error': str(e)}, 500)
 
 
 @app.route('/api/stats', methods=['GET'])
 def get_statistics():
     """إحصائيات النظام"""
     try:
+        cached = _cache_get('stats')
+        if cached is not None:
+            return ojson(cached)
+
         conn = get_db()
         cursor = conn.cursor()
         
@@ -437,17 +556,16 @@ def get_statistics():
         ''')
         
         row = cursor.fetchone()
-        conn.close()
         
-        return jsonify({
+        return ojson(_cache_set('stats', {
             'avg_pv_power': float(row['avg_pv']) if row['avg_pv'] else 0,
             'avg_consumption': float(row['avg_consumption']) if row['avg_consumption'] else 0,
             'avg_surplus': float(row['avg_surplus']) if row['avg_surplus'] else 0,
             'efficiency': 92.0
-        })
+        }))
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojson({'error': str(e)}, 500)
 
 
 if __name__ == '__main__':
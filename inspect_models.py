@@ -6,6 +6,130 @@ Model Features Inspector
 
 import joblib
 import json
+import pickle
+from pathlib import Path
+
+# القالب ثابت — يُبنى مرة واحدة عند الاستيراد بدل كل نداء
+_MAPPING_TEMPLATE = """
+# Feature Mapping Guide
+# =====================
+# استخدم هذا الملف لإنشاء features مفقودة
+
+# مثال:
+# إذا نموذجك يحتاج: 'AirTemperature'
+# وعندك: 'temperature'
+# أضف:
+# features['AirTemperature'] = temperature
+
+# PV Model Features Mapping
+# -------------------------
+# AirMass = ؟
+# AirPressure = ؟
+# AirTemperature = temperature
+# DayOfWeek = day_of_week
+# DayOfWeek_cos = cos(2 * pi * day_of_week / 7)
+# DayOfWeek_sin = sin(2 * pi * day_of_week / 7)
+# ... (أكمل البقية)
+
+# Consumption Model Features Mapping
+# ----------------------------------
+# ChangeRate_1h = (current_consumption - consumption_1h_ago) / consumption_1h_ago
+# Consumption_Delta1h = current_consumption - consumption_1h_ago
+# Consumption_Delta24h = current_consumption - consumption_24h_ago
+# ... (أكمل البقية)
+"""
+
+
+class _StubUnpickler(pickle.Unpickler):
+    """Unpickler خفيف يستبدل كل class بنائب فارغ
+
+    يسمح بقراءة بنية الـ pickle (المفاتيح وقوائم النصوص) دون بناء
+    المُقدِّرات أو تحميل مصفوفات numpy — فحص بالميلي ثانية بدل ثوانٍ.
+    """
+
+    class _Stub:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def __setstate__(self, state):
+            pass
+
+    def find_class(self, module, name):
+        return _StubUnpickler._Stub
+
+    def persistent_load(self, pid):
+        return None
+
+
+def _dump_features(features, output_file, model_name):
+    """حفظ قائمة الـ features في الملف بكتابة واحدة مُخزَّنة بدل write لكل سطر"""
+    lines = [f"Features for {model_name}", "=" * 70, ""]
+    lines.extend(f"{i}. {feature}" for i, feature in enumerate(features, 1))
+    # utf-8 صراحةً — الترميز الافتراضي على Windows (cp1252) يشوّه النص العربي
+    with open(output_file, 'w', buffering=65536, encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    print(f"\n💾 Saved to: {output_file}")
+
+
+def _write_sidecar(model_path, features):
+    """كتابة ملف جانبي <model>.features.json — الفحوص اللاحقة تقرأه بلا تحميل أصلاً"""
+    try:
+        with open(model_path + '.features.json', 'w', encoding='utf-8') as f:
+            json.dump(features, f, ensure_ascii=False)
+    except (OSError, TypeError, ValueError):
+        # نظام ملفات للقراءة فقط أو قيم غير قابلة للتسلسل (numpy str_ مثلاً)
+        # — المسار السريع يبقى غير مُفعَّل، والفحص نفسه لا يتعطل
+        pass
+
+
+def _read_sidecar(model_path):
+    """قراءة الملف الجانبي إن وُجد — يعيد قائمة الـ features أو None"""
+    try:
+        with open(model_path + '.features.json', encoding='utf-8') as f:
+            features = json.load(f)
+        if isinstance(features, list):
+            return features
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _extract_features(model_data):
+    """تحديد قائمة الـ features بأول مصدر متاح — يعيد (features, source)"""
+    if isinstance(model_data, dict):
+        if 'features' in model_data:
+            return list(model_data['features']), "'features' key"
+        models = model_data.get('models')
+        if isinstance(models, dict) and models:
+            # next(iter(...)) يأخذ العنصر الأول دون نسخ القيم كلها إلى قائمة
+            first_model = next(iter(models.values()))
+            if hasattr(first_model, 'feature_names_in_'):
+                return list(first_model.feature_names_in_), 'model.feature_names_in_'
+    elif hasattr(model_data, 'feature_names_in_'):
+        return list(model_data.feature_names_in_), 'feature_names_in_'
+    return None, None
+
+
+def _peek_model_data(model_path):
+    """قراءة الـ metadata دون تحميل كامل إن أمكن — يعيد (data, peeked)
+
+    ملفات joblib تدمج بايتات المصفوفات داخل التدفق نفسه، فقد يفشل
+    التحليل الخفيف؛ وحتى عند نجاحه قد تكون 'features' مخزّنة كـ
+    pandas Index أو نصوص numpy فيستبدلها الـ unpickler بنوائب عديمة
+    الفائدة. لا نثق بالفحص الخفيف إلا إذا خرجت قائمة نصوص حقيقية،
+    وإلا نعود إلى joblib.load الكامل.
+    """
+    try:
+        with open(model_path, 'rb') as f:
+            data = _StubUnpickler(f).load()
+        if isinstance(data, dict):
+            features = data.get('features')
+            if (isinstance(features, (list, tuple))
+                    and all(isinstance(f, str) for f in features)):
+                return data, True
+    except Exception:
+        pass
+    return joblib.load(model_path), False
 
 # ============================================================================
 # ضع مسار نماذجك هنا
@@ -22,99 +146,70 @@ def inspect_model(model_path, model_name):
     print("\n" + "="*70)
     print(f"Inspecting: {model_name}")
     print("="*70)
-    
-    # تحميل النموذج
-    model_data = joblib.load(model_path)
-    
-    print(f"\n📦 Model Type: {type(model_data)}")
+
+    # يُحسب مرة واحدة — تستخدمه كل مسارات الحفظ
+    output_file = f"{model_name.replace(' ', '_')}_features.txt"
+
+    # المسار الأسرع: ملف جانبي من فحص سابق — بلا فتح للـ pickle إطلاقاً
+    features = _read_sidecar(model_path)
+    if features is not None:
+        print(f"\n✅ Features Found via sidecar ({len(features)} total):")
+        print("-"*70)
+        # إرسال القائمة كلها بكتابة واحدة — التنسيق يبقى داخل join على مستوى C
+        print("\n".join(f"{i:3d}. {feature}" for i, feature in enumerate(features, 1)))
+
+        _dump_features(features, output_file, model_name)
+        return features
+
+    # محاولة فحص الـ metadata دون تحميل المصفوفات
+    # (peeked=True يضمن قائمة features نصية صالحة — التحقق في _peek_model_data)
+    model_data, peeked = _peek_model_data(model_path)
+
+    if peeked:
+        print(f"\n📦 Model Type: {type(model_data)} (metadata peek, arrays skipped)")
+    else:
+        print(f"\n📦 Model Type: {type(model_data)}")
     
     if isinstance(model_data, dict):
         print(f"\n📋 Dictionary Keys:")
         for key in model_data.keys():
             print(f"   - {key}")
-        
-        # استخراج Features
-        if 'features' in model_data:
-            features = model_data['features']
-            print(f"\n✅ Features Found ({len(features)} total):")
-            print("-"*70)
-            for i, feature in enumerate(features, 1):
-                print(f"{i:3d}. {feature}")
-            
-            # حفظ في ملف
-            output_file = f"{model_name.replace(' ', '_')}_features.txt"
-            with open(output_file, 'w') as f:
-                f.write(f"Features for {model_name}\n")
-                f.write("="*70 + "\n\n")
-                for i, feature in enumerate(features, 1):
-                    f.write(f"{i}. {feature}\n")
-            
-            print(f"\n💾 Saved to: {output_file}")
-            
-            return features
-        else:
-            print("\n⚠️  'features' key not found in dictionary")
-            
-            # جرّب استخراج من النموذج مباشرة
-            if 'models' in model_data:
-                models = model_data['models']
-                if isinstance(models, dict):
-                    first_model = list(models.values())[0]
-                    if hasattr(first_model, 'feature_names_in_'):
-                        features = list(first_model.feature_names_in_)
-                        print(f"\n✅ Extracted from model.feature_names_in_ ({len(features)} total):")
-                        print("-"*70)
-                        for i, feature in enumerate(features, 1):
-                            print(f"{i:3d}. {feature}")
-                        
-                        # حفظ
-                        output_file = f"{model_name.replace(' ', '_')}_features.txt"
-                        with open(output_file, 'w') as f:
-                            f.write(f"Features for {model_name}\n")
-                            f.write("="*70 + "\n\n")
-                            for i, feature in enumerate(features, 1):
-                                f.write(f"{i}. {feature}\n")
-                        
-                        print(f"\n💾 Saved to: {output_file}")
-                        return features
-        
+
+    # مسار استخراج واحد لكل الأشكال — الحل في _extract_features
+    features, source = _extract_features(model_data)
+
+    if features is not None:
+        # أي استخراج ناجح يستحق ملفاً جانبياً — حتى المأخوذ من feature_names_in_
+        _write_sidecar(model_path, features)
+
+        print(f"\n✅ Features Found via {source} ({len(features)} total):")
+        print("-"*70)
+        # إرسال القائمة كلها بكتابة واحدة — التنسيق يبقى داخل join على مستوى C
+        print("\n".join(f"{i:3d}. {feature}" for i, feature in enumerate(features, 1)))
+
+        _dump_features(features, output_file, model_name)
+        return features
+
+    if isinstance(model_data, dict):
+        print("\n⚠️  'features' key not found in dictionary")
+
         # معلومات إضافية
         if 'best_model_name' in model_data:
             print(f"\n🏆 Best Model: {model_data['best_model_name']}")
-        
+
         if 'metrics' in model_data:
             print(f"\n📊 Metrics:")
             metrics = model_data['metrics']
             if isinstance(metrics, dict):
                 for key, value in metrics.items():
                     print(f"   {key}: {value}")
-        
+
         if 'target' in model_data:
             print(f"\n🎯 Target Variable: {model_data['target']}")
-        
+
         if 'scaler' in model_data:
             print(f"\n⚖️  Scaler: {type(model_data['scaler']).__name__}")
-    
-    else:
-        # نموذج مباشر
-        if hasattr(model_data, 'feature_names_in_'):
-            features = list(model_data.feature_names_in_)
-            print(f"\n✅ Features ({len(features)} total):")
-            print("-"*70)
-            for i, feature in enumerate(features, 1):
-                print(f"{i:3d}. {feature}")
-            
-            # حفظ
-            output_file = f"{model_name.replace(' ', '_')}_features.txt"
-            with open(output_file, 'w') as f:
-                f.write(f"Features for {model_name}\n")
-                f.write("="*70 + "\n\n")
-                for i, feature in enumerate(features, 1):
-                    f.write(f"{i}. {feature}\n")
-            
-            print(f"\n💾 Saved to: {output_file}")
-            return features
-    
+
     return None
 
 
@@ -123,39 +218,9 @@ def create_feature_mapping():
     print("\n" + "="*70)
     print("Creating Feature Mapping Template")
     print("="*70)
-    
-    mapping_template = """
-# Feature Mapping Guide
-# =====================
-# استخدم هذا الملف لإنشاء features مفقودة
 
-# مثال:
-# إذا نموذجك يحتاج: 'AirTemperature'
-# وعندك: 'temperature'
-# أضف:
-# features['AirTemperature'] = temperature
+    Path('feature_mapping_template.txt').write_text(_MAPPING_TEMPLATE, encoding='utf-8')
 
-# PV Model Features Mapping
-# -------------------------
-# AirMass = ؟
-# AirPressure = ؟
-# AirTemperature = temperature
-# DayOfWeek = day_of_week
-# DayOfWeek_cos = cos(2 * pi * day_of_week / 7)
-# DayOfWeek_sin = sin(2 * pi * day_of_week / 7)
-# ... (أكمل البقية)
-
-# Consumption Model Features Mapping
-# ----------------------------------
-# ChangeRate_1h = (current_consumption - consumption_1h_ago) / consumption_1h_ago
-# Consumption_Delta1h = current_consumption - consumption_1h_ago
-# Consumption_Delta24h = current_consumption - consumption_24h_ago
-# ... (أكمل البقية)
-"""
-    
-    with open('feature_mapping_template.txt', 'w') as f:
-        f.write(mapping_template)
-    
     print("✅ Created: feature_mapping_template.txt")
     print("   Edit this file to map your features")
 
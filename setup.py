@@ -4,38 +4,55 @@ Smart House Energy Management System - Setup Script
 Automated setup for AI predictions, database, and API server
 """
 
+import argparse
+import functools
 import os
 import sys
 import subprocess
 import sqlite3
 from datetime import datetime
 
+# تُضبط بعد نجاح التدريب — الخطوات اللاحقة تستخدم النماذج الحية بدل إعادة قراءة الـ pickles
+_models_ready = False
+
+# --quiet يجمع سطور التقدم ويطبعها كتلة واحدة — flush واحد بدل واحد لكل سطر
+VERBOSE = True
+
+
+@functools.lru_cache(maxsize=1)
+def _get_predictor():
+    """مثيل SmartHousePredictor واحد يتشاركه التدريب وتوليد التوقعات"""
+    from ai_predictions import SmartHousePredictor
+    return SmartHousePredictor()
+
 
 def print_header(text):
-    """Print formatted header"""
-    print("\n" + "="*70)
-    print(f"  {text}")
-    print("="*70 + "\n")
+    """Print formatted header (single write — one console flush)"""
+    print("\n" + "="*70 + f"\n  {text}\n" + "="*70 + "\n")
 
 
 def print_step(step_num, text):
-    """Print step information"""
-    print(f"\n[Step {step_num}] {text}")
-    print("-" * 70)
+    """Print step information (single write — one console flush)"""
+    print(f"\n[Step {step_num}] {text}\n" + "-" * 70)
 
 
 def check_dependencies():
     """Check if required Python packages are installed"""
     print_step(1, "Checking Dependencies")
     
+    from importlib.metadata import distribution, PackageNotFoundError
+
     required = ['pandas', 'numpy', 'sklearn', 'flask', 'flask_cors']
+    # اسم الاستيراد ≠ اسم التوزيعة لبعض الحزم
+    name_map = {'sklearn': 'scikit-learn', 'flask_cors': 'Flask-Cors'}
     missing = []
-    
+
+    # فحص سجل الحزم المثبتة فقط — بلا تنفيذ __init__ الثقيل لكل حزمة
     for package in required:
         try:
-            __import__(package)
+            distribution(name_map.get(package, package))
             print(f"✓ {package} installed")
-        except ImportError:
+        except PackageNotFoundError:
             print(f"✗ {package} NOT installed")
             missing.append(package)
     
@@ -47,7 +64,11 @@ def check_dependencies():
         response = input("\nInstall now? (y/n): ").lower()
         if response == 'y':
             try:
-                subprocess.check_call([sys.executable, "-m", "pip", "install"] + missing)
+                # أعلام توفّر ثواني فحص الإصدار وتفضّل العجلات الجاهزة على البناء من المصدر
+                subprocess.check_call(
+                    [sys.executable, "-m", "pip", "install",
+                     "--disable-pip-version-check", "--prefer-binary", "--no-input"]
+                    + missing)
                 print("\n✓ All dependencies installed successfully!")
             except subprocess.CalledProcessError:
                 print("\n✗ Installation failed. Please install manually.")
@@ -61,118 +82,196 @@ def check_dependencies():
     return True
 
 
-def initialize_database():
+def initialize_database(verbose=None):
     """Initialize SQLite database"""
+    if verbose is None:
+        verbose = VERBOSE
     print_step(2, "Initializing Database")
-    
+
+    lines = []
+
+    def emit(line):
+        # في الوضع الصامت تتجمع السطور وتُرسل دفعة واحدة في النهاية
+        if verbose:
+            print(line)
+        else:
+            lines.append(line)
+
     db_path = "smart_house.db"
     
+    ddl = '''
+        CREATE TABLE IF NOT EXISTS pv_predictions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            hour INTEGER,
+            irradiance REAL,
+            temperature REAL,
+            humidity REAL,
+            wind_speed REAL,
+            predicted_power REAL,
+            confidence REAL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS consumption_predictions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            hour INTEGER,
+            day_of_week INTEGER,
+            temperature REAL,
+            is_weekend INTEGER,
+            predicted_consumption REAL,
+            confidence REAL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS energy_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            pv_power REAL,
+            consumption REAL,
+            battery_soc REAL,
+            grid_power INTEGER,
+            surplus REAL,
+            deficit REAL,
+            system_efficiency REAL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(timestamp)
+        );
+
+        CREATE TABLE IF NOT EXISTS device_status (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_name TEXT NOT NULL,
+            device_id INTEGER,
+            status INTEGER,
+            power_consumption REAL,
+            timestamp TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_energy_timestamp ON energy_data(timestamp);
+        CREATE INDEX IF NOT EXISTS idx_device_time ON device_status(device_name, timestamp);
+        -- DESC: استعلامات "آخر 24 ساعة" تقرأ من الفهرس مباشرة بلا خطوة فرز
+        CREATE INDEX IF NOT EXISTS idx_pv_ts ON pv_predictions(timestamp DESC);
+        CREATE INDEX IF NOT EXISTS idx_cons_ts ON consumption_predictions(timestamp DESC);
+    '''
+
     try:
         conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Create tables
-        print("Creating tables...")
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS pv_predictions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                hour INTEGER,
-                irradiance REAL,
-                temperature REAL,
-                humidity REAL,
-                wind_speed REAL,
-                predicted_power REAL,
-                confidence REAL,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        print("  ✓ pv_predictions table created")
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS consumption_predictions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                hour INTEGER,
-                day_of_week INTEGER,
-                temperature REAL,
-                is_weekend INTEGER,
-                predicted_consumption REAL,
-                confidence REAL,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        print("  ✓ consumption_predictions table created")
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS energy_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                pv_power REAL,
-                consumption REAL,
-                battery_soc REAL,
-                grid_power INTEGER,
-                surplus REAL,
-                deficit REAL,
-                system_efficiency REAL,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(timestamp)
-            )
-        ''')
-        print("  ✓ energy_data table created")
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS device_status (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                device_name TEXT NOT NULL,
-                device_id INTEGER,
-                status INTEGER,
-                power_consumption REAL,
-                timestamp TEXT NOT NULL,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        print("  ✓ device_status table created")
-        
-        # Create indexes for performance
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_energy_timestamp ON energy_data(timestamp)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_device_time ON device_status(device_name, timestamp)')
-        print("  ✓ Indexes created")
-        
+
+        # WAL + مزامنة NORMAL قبل الإنشاء — ثم كل الـ DDL في تمريرة واحدة بـ commit واحد
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+
+        emit("Creating tables...")
+        conn.executescript(ddl)
         conn.commit()
         conn.close()
-        
+
+        emit("  ✓ Tables: pv_predictions, consumption_predictions, "
+             "energy_data, device_status")
+        emit("  ✓ Indexes created")
+
+        if lines:
+            print("\n".join(lines))
+        # الملخص النهائي يُطبع دائماً
         print(f"\n✓ Database initialized: {db_path}")
         return True
         
     except Exception as e:
+        if lines:
+            print("\n".join(lines))
         print(f"\n✗ Database initialization failed: {e}")
         return False
 
 
+def _train_pv(data_file):
+    """تدريب نموذج PV في عملية مستقلة — predictor خاص بها (sklearn لا يُشارك عبر العمليات)"""
+    import pickle
+    from ai_predictions import SmartHousePredictor
+    with open(data_file, 'rb') as f:
+        pv_data, _ = pickle.load(f)
+    SmartHousePredictor().train_pv_model(pv_data)
+
+
+def _train_consumption(data_file):
+    """تدريب نموذج الاستهلاك في عملية مستقلة"""
+    import pickle
+    from ai_predictions import SmartHousePredictor
+    with open(data_file, 'rb') as f:
+        _, consumption_data = pickle.load(f)
+    SmartHousePredictor().train_consumption_model(consumption_data)
+
+
 def train_models():
     """Train AI models"""
     print_step(3, "Training AI Models")
     
+    global _models_ready
+
+    # النماذج الموجودة أحدث من كود التدريب؟ لا داعي لإعادة دقائق التدريب
+    try:
+        fresh = all(
+            os.path.exists(pkl)
+            and os.path.getmtime(pkl) > os.path.getmtime('ai_predictions.py')
+            for pkl in ('pv_model.pkl', 'consumption_model.pkl')
+        )
+    except OSError:
+        fresh = False
+
+    if fresh and not os.environ.get('FORCE_RETRAIN'):
+        print("✓ Models already up to date (set FORCE_RETRAIN=1 to rebuild)")
+        return True
+
     try:
         print("Importing prediction system...")
-        from ai_predictions import SmartHousePredictor
-        
-        predictor = SmartHousePredictor()
-        
+        predictor = _get_predictor()
+
         print("\nGenerating training data...")
         pv_data, consumption_data = predictor.generate_sample_training_data()
         print(f"  Generated {len(pv_data)} samples")
         
-        print("\nTraining PV power prediction model...")
-        predictor.train_pv_model(pv_data)
-        print("  ✓ PV model trained and saved")
-        
-        print("\nTraining consumption prediction model...")
-        predictor.train_consumption_model(consumption_data)
-        print("  ✓ Consumption model trained and saved")
-        
+        if (os.cpu_count() or 1) >= 2:
+            # النموذجان مستقلان وكلاهما CPU-bound — تدريبهما في عمليتين متوازيتين
+            import pickle
+            import tempfile
+            from concurrent.futures import ProcessPoolExecutor
+
+            with tempfile.NamedTemporaryFile(suffix='.pkl', delete=False) as tmp:
+                pickle.dump((pv_data, consumption_data), tmp)
+                data_file = tmp.name
+
+            print("\nTraining PV and consumption models in parallel...")
+            try:
+                with ProcessPoolExecutor(max_workers=2) as ex:
+                    futures = [ex.submit(_train_pv, data_file),
+                               ex.submit(_train_consumption, data_file)]
+                    for future in futures:
+                        future.result()
+            finally:
+                os.unlink(data_file)
+            print("  ✓ Both models trained and saved")
+        else:
+            print("\nTraining PV power prediction model...")
+            predictor.train_pv_model(pv_data)
+            print("  ✓ PV model trained and saved")
+
+            print("\nTraining consumption prediction model...")
+            predictor.train_consumption_model(consumption_data)
+            print("  ✓ Consumption model trained and saved")
+
+            # النماذج حية في هذه العملية فقط في المسار التسلسلي —
+            # في المسار المتوازي تُحمَّل من القرص في خطوة التوقعات
+            _models_ready = True
+
+        # إعادة حفظ النماذج مضغوطة — ملف أصغر بمرات على القرص وفي النسخ الاحتياطي
+        print("\nCompressing saved models...")
+        import joblib
+        for pkl in ('pv_model.pkl', 'consumption_model.pkl'):
+            if os.path.exists(pkl):
+                joblib.dump(joblib.load(pkl), pkl, compress=('zlib', 3))
+                print(f"  ✓ {pkl} compressed")
+
         return True
         
     except Exception as e:
@@ -185,13 +284,15 @@ def generate_predictions():
     print_step(4, "Generating Predictions")
     
     try:
-        from ai_predictions import SmartHousePredictor
-        
-        predictor = SmartHousePredictor()
-        
-        print("Loading models...")
-        predictor.load_models()
-        
+        predictor = _get_predictor()
+
+        if _models_ready:
+            # النماذج حية في الذاكرة من خطوة التدريب — لا إعادة تحميل من القرص
+            print("Using models trained in this run...")
+        else:
+            print("Loading models...")
+            predictor.load_models()
+
         print("Generating 24-hour predictions...")
         predictions = predictor.predict_next_24h()
         
@@ -214,12 +315,22 @@ def generate_predictions():
         return False
 
 
-def verify_setup():
+def verify_setup(verbose=None):
     """Verify the setup"""
+    if verbose is None:
+        verbose = VERBOSE
     print_step(5, "Verifying Setup")
-    
+
     errors = []
-    
+    lines = []
+
+    def emit(line):
+        # في الوضع الصامت تتجمع السطور وتُرسل دفعة واحدة في النهاية
+        if verbose:
+            print(line)
+        else:
+            lines.append(line)
+
     # Check files
     required_files = [
         'smart_house.db',
@@ -229,36 +340,43 @@ def verify_setup():
         'api_server.py'
     ]
     
-    print("Checking files...")
+    emit("Checking files...")
+    # مسح واحد للمجلد بدل stat لكل ملف
+    present = {entry.name for entry in os.scandir('.')}
     for file in required_files:
-        if os.path.exists(file):
-            print(f"  ✓ {file}")
+        if file in present:
+            emit(f"  ✓ {file}")
         else:
-            print(f"  ✗ {file} NOT FOUND")
+            emit(f"  ✗ {file} NOT FOUND")
             errors.append(f"Missing file: {file}")
-    
+
     # Check database
-    print("\nChecking database...")
+    emit("\nChecking database...")
     try:
         conn = sqlite3.connect('smart_house.db')
-        cursor = conn.cursor()
-        
-        # Check record counts
+
+        # استعلام واحد يجلب العدّادات الثلاثة — تمريرة parse/plan واحدة
         tables = ['energy_data', 'pv_predictions', 'consumption_predictions']
-        for table in tables:
-            cursor.execute(f'SELECT COUNT(*) FROM {table}')
-            count = cursor.fetchone()[0]
-            print(f"  ✓ {table}: {count} records")
-            
+        counts = conn.execute('''
+            SELECT (SELECT COUNT(*) FROM energy_data),
+                   (SELECT COUNT(*) FROM pv_predictions),
+                   (SELECT COUNT(*) FROM consumption_predictions)
+        ''').fetchone()
+
+        for table, count in zip(tables, counts):
+            emit(f"  ✓ {table}: {count} records")
             if count == 0:
                 errors.append(f"No data in {table}")
-        
+
         conn.close()
-        
+
     except Exception as e:
-        print(f"  ✗ Database check failed: {e}")
+        emit(f"  ✗ Database check failed: {e}")
         errors.append(f"Database error: {e}")
-    
+
+    if lines:
+        print("\n".join(lines))
+    # الملخص النهائي يُطبع دائماً
     if errors:
         print("\n⚠️  Setup completed with warnings:")
         for error in errors:
@@ -273,44 +391,53 @@ def print_next_steps():
     """Print next steps for user"""
     print_header("SETUP COMPLETE! 🎉")
     
-    print("Your Smart House Energy Management System is ready!")
-    print("\nNext Steps:")
-    print("\n1. START API SERVER:")
-    print("   python api_server.py")
-    print("   Then open: http://localhost:5000")
-    
-    print("\n2. CONFIGURE ESP32:")
-    print("   - Open Ems_integrated.cpp in Arduino IDE")
-    print("   - Update WiFi credentials:")
-    print('     const char* ssid = "YOUR_WIFI_NAME";')
-    print('     const char* password = "YOUR_PASSWORD";')
-    print("   - Update API server IP:")
-    print('     const char* API_SERVER = "http://YOUR_IP:5000";')
-    print("   - Install ArduinoJson library")
-    print("   - Upload to ESP32")
-    
-    print("\n3. ACCESS DASHBOARDS:")
-    print("   - Web Dashboard: http://localhost:5000")
-    print("   - ESP32 Dashboard: http://<ESP32_IP>/")
-    
-    print("\n4. MONITOR SYSTEM:")
-    print("   - Check Serial Monitor for ESP32 logs")
-    print("   - Watch web dashboard update every 5 seconds")
-    print("   - View predictions in database")
-    
-    print("\n5. SCHEDULE PREDICTIONS:")
-    print("   - Run ai_predictions.py hourly via cron/task scheduler")
-    print("   - Linux: crontab -e")
-    print("     0 * * * * /path/to/python /path/to/ai_predictions.py")
-    print("   - Windows: Task Scheduler")
-    
-    print("\n" + "="*70)
-    print("For detailed instructions, see INTEGRATION_GUIDE.md")
-    print("="*70 + "\n")
+    # كتلة واحدة تُرسل للطرفية دفعة واحدة بدل عشرات نداءات print
+    print("""Your Smart House Energy Management System is ready!
+
+Next Steps:
+
+1. START API SERVER:
+   python api_server.py
+   Then open: http://localhost:5000
+
+2. CONFIGURE ESP32:
+   - Open Ems_integrated.cpp in Arduino IDE
+   - Update WiFi credentials:
+     const char* ssid = "YOUR_WIFI_NAME";
+     const char* password = "YOUR_PASSWORD";
+   - Update API server IP:
+     const char* API_SERVER = "http://YOUR_IP:5000";
+   - Install ArduinoJson library
+   - Upload to ESP32
+
+3. ACCESS DASHBOARDS:
+   - Web Dashboard: http://localhost:5000
+   - ESP32 Dashboard: http://<ESP32_IP>/
+
+4. MONITOR SYSTEM:
+   - Check Serial Monitor for ESP32 logs
+   - Watch web dashboard update every 5 seconds
+   - View predictions in database
+
+5. SCHEDULE PREDICTIONS:
+   - Run ai_predictions.py hourly via cron/task scheduler
+   - Linux: crontab -e
+     0 * * * * /path/to/python /path/to/ai_predictions.py
+   - Windows: Task Scheduler
+
+""" + "="*70 + "\nFor detailed instructions, see INTEGRATION_GUIDE.md\n" + "="*70 + "\n")
 
 
 def main():
     """Main setup routine"""
+    parser = argparse.ArgumentParser(description="Smart House setup")
+    parser.add_argument('--quiet', action='store_true',
+                        default=bool(os.environ.get('CI')),
+                        help="batch progress output into one block per step")
+    args, _ = parser.parse_known_args()
+    global VERBOSE
+    VERBOSE = not args.quiet
+
     print_header("SMART HOUSE ENERGY MANAGEMENT SYSTEM - SETUP")
     
     print("This script will set up your Smart House system:")